@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+
+# Search and detail pages of La Voz, Mercado Libre, Zonaprop and OLX, built from the url with the same structure that
+# the scrappers read, and a RequestGetter that answers with them (or with the pages saved in a response cache)
+# instead of connecting to the sites. Used by scrapperThroughput.py, which puts src in the path.
+
+import json
+import re
+from time import sleep
+from threading import Lock
+
+HOUSES_PER_PAGE = 20
+DESCRIPTION = "Hermosa casa con jardín, cochera, quincho y pileta, a metros de la plaza. " * 15
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content if isinstance(content, bytes) else content.encode("UTF-8")
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.headers = {}
+
+    @property
+    def text(self):
+        return self.content.decode("UTF-8")
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def get_page_number(url, pattern, default=1):
+    match = re.search(pattern, url)
+    return int(match.group(1)) if match else default
+
+
+def get_house_ids(page):
+    return [page * 1000 + i for i in range(HOUSES_PER_PAGE)]
+
+
+def build_filler():
+    return "<div class='card'><span>Publicidad</span><p>{}</p></div>".format("texto " * 40) * 60
+
+
+def lavoz_search(url):
+    page = get_page_number(url, r"&page=(\d+)", 0)
+    links = "".join(
+        '<a class="text-decoration-none" href="https://clasificados.lavoz.com.ar/avisos/casas/{id}/casa-{id}.html">'
+        '<h2>Casa en venta {id}</h2><span>$ {price}</span></a>'.format(id=house_id, price=5000000 + house_id)
+        for house_id in get_house_ids(page))
+    return "<html><body>{filler}{links}{filler}</body></html>".format(filler=build_filler(), links=links)
+
+
+def lavoz_house(url):
+    house_id = re.search(r"/(\d+)/", url).group(1)
+    metas = "".join('<meta name="cXenseParse:{}" content="{}"/>'.format(name, value) for name, value in [
+        ("recs:articleid", house_id), ("precio", 5000000), ("moneda", "$"), ("dormitorios", 3),
+        ("recs:publishtime", "2020-03-21T10:00:00.000Z")])
+    metas += '<meta property="og:title" content="Casa en venta {}"/>'.format(house_id)
+    metas += '<meta property="og:description" content="{}"/>'.format(DESCRIPTION)
+    metas += '<meta property="og:url" content="{}"/>'.format(url)
+    return ('<html><head>{metas}</head><body>{filler}<div id="tel">0351 155{id:0>6}</div>{filler}'
+            '</body></html>').format(metas=metas, filler=build_filler(), id=house_id[-6:])
+
+
+def meli_search(url):
+    page = (get_page_number(url, r"_Desde_(\d+)") - 1) // 48 + 1
+    links = "".join(
+        '<a class="item__info-link" href="https://casa.mercadolibre.com.ar/MLA-{id}-casa-en-venta-_JM">'
+        '<h2>Casa en venta {id}</h2><span>U$S {price}</span></a>'.format(id=house_id, price=90000 + house_id)
+        for house_id in get_house_ids(page))
+    return "<html><body>{filler}{links}{filler}</body></html>".format(filler=build_filler(), links=links)
+
+
+def meli_house(url):
+    house_id = re.search(r"MLA-?(\d+)", url).group(1)
+    specs = "".join("<li><strong>{}</strong> <span>{}</span></li>".format(name, value) for name, value in [
+        ("Superficie total", "250 m²"), ("Ambientes", "5"), ("Dormitorios", "3"), ("Baños", "2")])
+    return ('<html><body>{filler}'
+            '<section class="short-description--static"><h1> Casa en venta {id} </h1>'
+            '<span class="price-tag"> <span>U$S</span> <span>{price}</span></span>'
+            '<dl><dt>a</dt> <dd>Casa</dd></dl><dl><dt>b</dt> <dd>250 m²</dd></dl>'
+            '<dl><dt>c</dt> <dd>5 ambientes</dd></dl><dl><dt>d</dt> <dd>2 baños</dd></dl></section>'
+            '<section class="vip-section-seller-info"> <h3>Vendedor</h3> <p>x</p> <div> <span>Inmobiliaria</span>'
+            '</div> <span class="profile-info-phone-value">0351 155123456</span></section>'
+            '<h2 class="map-address">Av. Colón {id}</h2><h3 class="map-location">Córdoba</h3>'
+            '<div class="item-description__text"><p>{description}</p></div>'
+            '<ul class="specs-list">{specs}</ul>'
+            '<script>var map = "https://maps.googleapis.com/maps/api/staticmap?center=-31.41%2C-64.18&zoom=15";'
+            '</script>{filler}</body></html>').format(filler=build_filler(), id=house_id, price=90000 + int(house_id),
+                                                      description=DESCRIPTION, specs=specs)
+
+
+def zonaprop_posting(posting_id):
+    return {
+        "postingId": str(posting_id),
+        "title": "Casa en venta de 3 dormitorios número {}".format(posting_id),
+        "descriptionNormalized": DESCRIPTION,
+        "antiquity": "10",
+        "url": "/propiedades/casa-{}.html".format(posting_id),
+        "postingType": "PROPERTY",
+        "priceOperationTypes": [{"operationType": {"name": "Venta"},
+                                 "prices": [{"amount": 100000 + posting_id, "currency": "USD"}]}],
+        "expenses": {"amount": 3000, "currency": "$"},
+        "mainFeatures": {"CFT100": {"label": "Superficie total", "value": "250", "measure": "m²"},
+                         "CFT2": {"label": "Dormitorios", "value": "3", "measure": None}},
+        "generalFeatures": {"Servicios": {"1": {"label": "Agua corriente"}, "2": {"label": "Gas natural"}}},
+        "flagsFeatures": [{"featureId": "dueno-directo"}],
+        "realEstateType": {"name": "Casa"},
+        "realEstateSubtype": None,
+        "publication": {"beginDate": {"yearOfEra": 2020, "monthOfYear": 3, "dayOfMonth": 21}},
+        "postingLocation": {"address": {"name": "Av. Colón {}".format(posting_id)},
+                            "location": {"name": "Córdoba"},
+                            "postingGeolocation": {"geolocation": {"latitude": -31.41, "longitude": -64.18},
+                                                   "urlStaticMap": "https://maps.googleapis.com/maps/api/staticmap"}},
+    }
+
+
+def zonaprop_search(url):
+    page = get_page_number(url, r"-pagina-(\d+)")
+    postings = json.dumps([zonaprop_posting(posting_id) for posting_id in get_house_ids(page)])
+    return ("<html><head><script>var dataLayer = [];</script></head><body>{filler}"
+            "<script>\n const listPostings = {postings};\n const developmentData = {{}};\n</script>"
+            "{filler}</body></html>").format(filler=build_filler(), postings=postings)
+
+
+def zonaprop_contact(data):
+    posting_id = re.search(r"idAviso=(\d+)", data).group(1)
+    return json.dumps({"status": {"status": 200},
+                       "contenido": {"anunciante": {"nombre": "Dueño {}".format(posting_id),
+                                                    "telefono": "0351 155123456"},
+                                     "resultadoContacto": {"response": {"codigo": 202, "clave": ""},
+                                                           "idUsuario": int(posting_id)}}})
+
+
+def olx_search(url):
+    page = get_page_number(url, r"-p-(\d+)")
+    tracking = json.dumps({"mixpanel": {"props": {"extra": get_house_ids(page)}}})
+    return '<html><body>{filler}<div id="tracking-data">{tracking}</div>{filler}</body></html>'.format(
+        filler=build_filler(), tracking=tracking)
+
+
+def olx_house(url):
+    house_id = int(re.search(r"/items/(\d+)", url).group(1))
+    return json.dumps({"coordinates": {"latitude": -31.41, "longitude": -64.18},
+                       "priceType": "FIXED",
+                       "price": {"amount": 90000 + house_id, "preCurrency": "U$S", "displayPrice": "U$S 90.000"},
+                       "description": DESCRIPTION,
+                       "title": "Casa en venta {}".format(house_id),
+                       "contactName": "Dueño",
+                       "slug": "casa-en-venta-iid-{}".format(house_id),
+                       "phoneType": "mobile",
+                       "phone": "0351 155123456",
+                       "location": {"name": "Córdoba", "children": [{"name": "Capital", "children": []}]},
+                       "user": {"professional": False, "publicName": "Dueño", "userName": "dueno"},
+                       "date": {"timestamp": "2020-03-21T10:00:00-03:00"},
+                       "category": {"originalName": "Casas - Venta"},
+                       "optionals": [{"name": "rooms", "value": "3"}, {"name": "bathrooms", "value": "2"}]})
+
+
+# The first pattern that matches the url builds its page.
+ROUTES = [
+    (r"clasificados\.lavoz\.com\.ar/buscar/", lavoz_search),
+    (r"clasificados\.lavoz\.com\.ar/avisos/", lavoz_house),
+    (r"inmuebles\.mercadolibre\.com\.ar/", meli_search),
+    (r"mercadolibre\.com\.ar/MLA", meli_house),
+    (r"zonaprop\.com\.ar/inmuebles-", zonaprop_search),
+    (r"olx\.com\.ar/api-v2/items/", olx_house),
+    (r"olx\.com\.ar/inmuebles", olx_search),
+]
+
+
+# Answers like RequestGetter. latency (seconds) is waited in each request to simulate the network. With a cache
+# directory, the pages are read from a response cache saved by a real execution (pages not saved are None).
+class FakeRequestGetter:
+    def __init__(self, workers=1, latency=0.0, cache_directory=None):
+        self.workers = workers
+        self.latency = latency
+        self.cache = None
+        self.replay_cache = None
+        if cache_directory:
+            from responseCache import ResponseCache
+            self.replay_cache = ResponseCache({"mode": "replay", "directory": cache_directory})
+        self.lock = Lock()
+        self.requests = 0
+        self.bytes = 0
+
+    def count(self, response):
+        with self.lock:
+            self.requests += 1
+            self.bytes += len(response.content) if response is not None else 0
+        return response
+
+    def get(self, url, skip_proxy=False):
+        if self.latency:
+            sleep(self.latency)
+        if self.replay_cache is not None:
+            entry = self.replay_cache.lookup(url)
+            return self.count(self.replay_cache.hit(entry) if entry is not None else None)
+        for pattern, build in ROUTES:
+            if re.search(pattern, url):
+                return self.count(FakeResponse(build(url)))
+        return self.count(FakeResponse("", 404))
+
+    def post(self, url, data, headers=None, budget=None):
+        if self.latency:
+            sleep(self.latency)
+        return self.count(FakeResponse(zonaprop_contact(data)))
+
+    def get_pool_stats(self):
+        return {}
+
+    def close(self):
+        if self.replay_cache is not None:
+            self.replay_cache.close()
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+# Runs each scrapper end to end over fixture pages (see fixturePages.py), or over the pages saved by a response cache,
+# without connecting to the sites. For each site and number of workers it prints pages/s, houses/s, CPU ms per page
+# and peak memory. With --output the results are saved as json; with --baseline they are compared with a saved one
+# and the scenarios slower than --tolerance are reported as regressions (exit code 1).
+# Usage: python3 benchmarks/scrapperThroughput.py [--sites lavoz meli zonaprop olx] [--workers 1 4] [--pages 5]
+#        [--latency 0] [--pipeline] [--streaming] [--cache DIR] [--output results.json] [--baseline results.json]
+#        [--tolerance 0.2]
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+from time import time, process_time
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.dirname(os.path.realpath(__file__)))
+
+SITES = ["lavoz", "meli", "zonaprop", "olx"]
+
+
+def build_config(site, pages, workers, streaming):
+    config = {"from_page": 1,
+              "pages": pages,
+              "publisher_types": ["inmobiliaria"],
+              "ids_filename": "benchmark",
+              "result_filename": "benchmark",
+              "resume": False,
+              "output": {"format": "csv", "streaming": str(streaming)},
+              "retries": {"filename": "temp/benchmark_retries.sqlite", "base_delay": 0}}
+    if site == "meli":
+        config["operation_types"] = ["venta"]
+    if site == "zonaprop":
+        config["contact_workers"] = workers
+    if site == "olx":
+        config["provinces"] = ["cordoba"]
+    return config
+
+
+def get_peak_memory_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes in Linux and in bytes in macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0), 1)
+
+
+def count_houses(report):
+    return sum(counter["value"] for counter in report["counters"]
+               if counter["name"] == "houses_total" and counter["labels"].get("result") == "ok")
+
+
+# Runs in a new process, so the peak memory and the metrics only belong to this scenario.
+def run_scenario(site, workers, pages, latency, pipeline, streaming, cache_directory):
+    os.chdir(ROOT)
+    from fixturePages import FakeRequestGetter
+    from orchestrator import SCRAPPERS
+    from metrics import metrics
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        os.makedirs(temp_path + "/temp")
+        request_getter = FakeRequestGetter(workers, latency, cache_directory)
+        scrapper = SCRAPPERS[site](build_config(site, pages, workers, streaming), request_getter, temp_path)
+        metrics.reset()
+        start = time()
+        start_cpu = process_time()
+        if pipeline:
+            scrapper.scrap_pipeline()
+        else:
+            scrapper.scrap()
+        seconds = time() - start
+        cpu_seconds = process_time() - start_cpu
+        request_getter.close()
+
+    houses = count_houses(metrics.get_report())
+    return {"site": site,
+            "workers": workers,
+            "requests": request_getter.requests,
+            "houses": houses,
+            "seconds": round(seconds, 3),
+            "pages_per_second": round(request_getter.requests / seconds, 1) if seconds else 0,
+            "houses_per_second": round(houses / seconds, 1) if seconds else 0,
+            "cpu_ms_per_page": round(cpu_seconds * 1000 / max(request_getter.requests, 1), 2),
+            "megabytes_per_second": round(request_getter.bytes / (1024.0 * 1024.0) / seconds, 1) if seconds else 0,
+            "peak_memory_mb": get_peak_memory_mb()}
+
+
+def run_isolated(args):
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        return pool.apply(run_scenario, args)
+
+
+def print_results(results):
+    print("{:<10}{:>8}{:>10}{:>8}{:>10}{:>10}{:>10}{:>10}".format("site", "workers", "requests", "houses", "pages/s",
+                                                                  "houses/s", "cpu ms/p", "peak MB"))
+    for result in results:
+        print("{site:<10}{workers:>8}{requests:>10}{houses:>8}{pages_per_second:>10}{houses_per_second:>10}"
+              "{cpu_ms_per_page:>10}{peak_memory}".format(peak_memory="{:>10}".format(str(result["peak_memory_mb"])),
+                                                          **result))
+
+
+# A scenario regresses when it does fewer pages per second, or uses more CPU per page, than the baseline by more than
+# the tolerance.
+def compare(results, baseline, tolerance):
+    baseline_results = {(result["site"], result["workers"]): result for result in baseline}
+    regressions = []
+    for result in results:
+        previous = baseline_results.get((result["site"], result["workers"]))
+        if previous is None:
+            continue
+        if result["pages_per_second"] < previous["pages_per_second"] * (1 - tolerance):
+            regressions.append("{site} workers:{workers} pages/s {} -> {}".format(
+                previous["pages_per_second"], result["pages_per_second"], **result))
+        if result["cpu_ms_per_page"] > previous["cpu_ms_per_page"] * (1 + tolerance):
+            regressions.append("{site} workers:{workers} cpu ms/page {} -> {}".format(
+                previous["cpu_ms_per_page"], result["cpu_ms_per_page"], **result))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline throughput of the scrappers")
+    parser.add_argument("--sites", nargs="+", default=SITES, choices=SITES)
+    parser.add_argument("--workers", nargs="+", type=int, default=[1, 4])
+    parser.add_argument("--pages", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0, help="milliseconds waited in each request")
+    parser.add_argument("--pipeline", action="store_true", help="scrap ids and houses at the same time")
+    parser.add_argument("--streaming", action="store_true", help="forget the houses once they are saved")
+    parser.add_argument("--cache", help="directory of a response cache to replay instead of the fixture pages")
+    parser.add_argument("--output", help="json file where the results are saved")
+    parser.add_argument("--baseline", help="json file with results to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    latency = args.latency / 1000.0
+    results = [run_isolated((site, workers, args.pages, latency, args.pipeline, args.streaming, args.cache))
+               for site in args.sites for workers in args.workers]
+    print_results(results)
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(results, output_file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
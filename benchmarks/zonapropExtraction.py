@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+# Compares the old Zonaprop listPostings extraction (full BeautifulSoup tree + string splits)
+# against jsonExtractor, over a generated search page.
+# Usage: python3 benchmarks/zonapropExtraction.py [postings] [repetitions]
+
+import importlib.util
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "src"))
+
+from jsonExtractor import extract_list_postings, iter_list_postings
+
+
+def build_posting(posting_id):
+    return {
+        "postingId": str(posting_id),
+        "title": "Casa en venta de 3 dormitorios con pileta número {}".format(posting_id),
+        "descriptionNormalized": "Hermosa casa con jardín, cochera y quincho. " * 20,
+        "url": "/propiedades/casa-{}.html".format(posting_id),
+        "priceOperationTypes": [{"operationType": {"name": "Venta"},
+                                 "prices": [{"amount": 100000 + posting_id, "currency": "USD"}]}],
+        "mainFeatures": {"CFT100": {"label": "Superficie total", "value": "250", "measure": "m²"}},
+        "generalFeatures": {"Servicios": {"1": {"label": "Agua corriente"}, "2": {"label": "Gas natural"}}},
+    }
+
+
+def build_page(postings):
+    filler = "<div class='card'><span>Aviso</span><p>{}</p></div>".format("texto " * 50) * 200
+    return ("<html><head><script>var dataLayer = [];</script></head><body>{filler}"
+            "<script>\n const listPostings = {postings};\n const developmentData = {{}};\n</script>"
+            "{filler}</body></html>").format(filler=filler,
+                                             postings=json.dumps([build_posting(i) for i in range(postings)])
+                                             ).encode("UTF-8")
+
+
+def extract_with_soup(content):
+    from bs4 import BeautifulSoup
+    response_soup = BeautifulSoup(content, 'html.parser')
+    for script in response_soup.find_all("script"):
+        if 'listPostings = ' in script.text:
+            house_list = script.text.split('listPostings = ')[1].split('const developmentData ')[0].strip()[:-1]
+            return json.loads(house_list)
+
+
+def main():
+    postings = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    page = build_page(postings)
+    print("page size: {:.1f} KB, postings: {}".format(len(page) / 1024, postings))
+
+    candidates = [("extract_list_postings", extract_list_postings),
+                  ("iter_list_postings", lambda content: list(iter_list_postings(content)))]
+    if importlib.util.find_spec("bs4") is not None:
+        candidates.insert(0, ("beautifulsoup + split", extract_with_soup))
+    else:
+        print("beautifulsoup4 is not installed, skipping the old extraction")
+
+    expected = extract_list_postings(page)
+    for name, extract in candidates:
+        assert extract(page) == expected, name
+        seconds = min(timeit.repeat(lambda: extract(page), number=repetitions, repeat=3)) / repetitions
+        print("{:<25} {:>10.3f} ms/page".format(name, seconds * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+from threading import Condition, Timer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+fh = logging.FileHandler('logs/backgroundStage.log')
+fh.setLevel(logging.INFO)
+formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
+fh.setFormatter(formatter)
+logger.addHandler(fh)
+
+
+class BackgroundStage:
+    def __init__(self, name, process, workers=1, max_attempts=3, retry_delay=60):
+        self.name = name
+        self.process = process
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.results = Queue()
+        self.pending = 0
+        self.pending_condition = Condition()
+
+    def submit(self, key, item):
+        with self.pending_condition:
+            self.pending += 1
+        self.executor.submit(self.run, key, item, 1)
+
+    def run(self, key, item, attempt):
+        try:
+            result = self.process(item)
+        except Exception as e:
+            if attempt < self.max_attempts:
+                logger.info("{} failed for [{}], attempt [{}], retrying in [{}]s | Exception: {}".format(
+                    self.name, key, attempt, self.retry_delay, e))
+                retry = Timer(self.retry_delay, self.executor.submit, args=(self.run, key, item, attempt + 1))
+                retry.daemon = True
+                retry.start()
+                return
+            logger.error("{} failed for [{}] after [{}] attempts | Exception: {}".format(self.name, key, attempt, e))
+            result = {"{}_error".format(self.name): str(e)}
+        self.results.put((key, result))
+        with self.pending_condition:
+            self.pending -= 1
+            self.pending_condition.notify_all()
+
+    def completed(self):
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except Empty:
+                return results
+
+    def join(self):
+        with self.pending_condition:
+            while self.pending > 0:
+                self.pending_condition.wait()
+        self.executor.shutdown()
+        return self.completed()
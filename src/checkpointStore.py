@@ -0,0 +1,63 @@
+import json
+import os
+
+from metrics import metrics
+
+
+class CheckpointStore:
+    def __init__(self, path, name):
+        self.records_filename = path + "/temp/temp_{}.jsonl".format(name)
+        self.processed_filename = path + "/temp/temp_{}_processed.jsonl".format(name)
+        self.pending_processed = []
+
+    def reset(self):
+        self.pending_processed = []
+        for filename in [self.records_filename, self.processed_filename]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def append_lines(self, filename, rows):
+        if not rows:
+            return
+        lines = "".join(json.dumps(row, default=str) + "\n" for row in rows)
+        with open(filename, "a+", encoding="UTF-8") as checkpoint_file:
+            # A crash in the middle of a write leaves the last line incomplete,
+            # it is closed here so the new rows start in their own line.
+            if checkpoint_file.tell() > 0:
+                checkpoint_file.seek(checkpoint_file.tell() - 1)
+                if checkpoint_file.read(1) != "\n":
+                    lines = "\n" + lines
+            checkpoint_file.write(lines)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+
+    def read_lines(self, filename):
+        if not os.path.exists(filename):
+            return
+        with open(filename, encoding="UTF-8") as checkpoint_file:
+            for line in checkpoint_file:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def mark_processed(self, key):
+        self.pending_processed.append(key)
+
+    def save(self, records):
+        with metrics.timer("persist_seconds", output="checkpoint"):
+            self.append_lines(self.records_filename, records)
+            self.append_lines(self.processed_filename, self.pending_processed)
+        self.pending_processed = []
+
+    def load_records(self):
+        return list(self.read_lines(self.records_filename))
+
+    def load_processed(self):
+        return set(self.read_lines(self.processed_filename))
+
+    def start(self, resume):
+        if not resume:
+            self.reset()
+            return [], set()
+        return self.load_records(), self.load_processed()
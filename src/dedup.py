@@ -0,0 +1,223 @@
+import logging
+import os
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow.parquet as pq
+except ImportError:
+    pq = None
+
+from listingStore import SITE_FIELDS
+from normalization import SITE_COLUMNS, get_first
+from outputSink import get_results_directory
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+fh = logging.FileHandler('logs/dedup.log')
+fh.setLevel(logging.INFO)
+formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
+fh.setFormatter(formatter)
+logger.addHandler(fh)
+
+NUMERIC_COLUMNS = ["price_value", "area_m2", "latitude", "longitude"]
+# Meters of a degree of latitude, and of longitude at the equator.
+METERS_PER_DEGREE = 111320.0
+
+
+class UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, item):
+        parent = self.parent
+        while parent[item] != item:
+            parent[item] = parent[parent[item]]
+            item = parent[item]
+        return item
+
+    # The root of each cluster is its first row.
+    def union(self, first, second):
+        first = self.find(first)
+        second = self.find(second)
+        if first != second:
+            self.parent[max(first, second)] = min(first, second)
+
+
+# The result files of the site saved today: <result_filename>_<scope>.csv, or a folder of parquet parts. The outputs
+# of the shards of a partitioned run (<result_filename>_shardNNNNN_<scope>) are left out, only their merge is read.
+def get_result_files(directory, result_filename):
+    prefix = result_filename + "_"
+    return [directory + "/" + name for name in sorted(os.listdir(directory)) if name.startswith(prefix)
+            and not name.startswith(prefix + "shard")
+            and (name.endswith(".csv") or os.path.isdir(directory + "/" + name))]
+
+
+# Only the columns used to find duplicates are read, as text, so phones like "3511234567" are not turned into numbers.
+# A file without houses (e.g. a scope without new houses) has no header and gives an empty DataFrame.
+def read_result(filename, is_wanted):
+    if filename.endswith(".csv"):
+        try:
+            return pd.read_csv(filename, usecols=is_wanted, dtype=str, keep_default_na=False)
+        except pd.errors.EmptyDataError:
+            return pd.DataFrame()
+    if pq is None:
+        logger.error("pyarrow is not installed, skipping [{}]".format(filename))
+        return pd.DataFrame()
+    parts = []
+    for part in sorted(os.listdir(filename)):
+        columns = [column for column in pq.read_schema(filename + "/" + part).names if is_wanted(column)]
+        parts.append(pq.read_table(filename + "/" + part, columns=columns).to_pandas().astype(str))
+    return pd.concat(parts, ignore_index=True, sort=False) if parts else pd.DataFrame()
+
+
+# One row for each house of the site: site, listing_id, url, the normalized columns and the formatted phones as
+# phone_0, phone_1...
+def load_site(directory, site, result_filename):
+    fields = SITE_FIELDS[site]
+    phones = SITE_COLUMNS[site]["phones"]
+    wanted = set(fields["listing_id"] + fields["url"] + NUMERIC_COLUMNS + ["currency_code"])
+
+    def is_wanted(column):
+        return column in wanted or (column.endswith("_formated") and phones.match(column[:-len("_formated")]))
+
+    frames = [read_result(filename, is_wanted) for filename in get_result_files(directory, result_filename)]
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame()
+    df = pd.concat(frames, ignore_index=True, sort=False).replace({"": None, "nan": None, "None": None})
+    houses = pd.DataFrame({"site": site,
+                           "listing_id": get_first(df, fields["listing_id"]),
+                           "url": get_first(df, fields["url"]),
+                           "currency_code": get_first(df, ["currency_code"])})
+    for column in NUMERIC_COLUMNS:
+        houses[column] = pd.to_numeric(df[column], errors="coerce") if column in df else np.nan
+    phone_columns = sorted(column for column in df.columns if column.endswith("_formated"))
+    for i, column in enumerate(phone_columns):
+        houses["phone_{}".format(i)] = df[column]
+    houses = houses[houses["listing_id"].notnull()]
+    logger.info("Loaded {} houses of [{}]".format(len(houses), site))
+    return houses.drop_duplicates(["site", "listing_id"])
+
+
+# The price rounded to two significant digits, so the block of a price holds the prices close to it.
+def get_price_bucket(prices):
+    magnitude = np.floor(np.log10(prices.where(prices > 0))) - 1
+    return np.round(prices / 10 ** magnitude) * 10 ** magnitude
+
+
+# Hash index of blocking keys: for each key, the rows that have it. A row has a key for each of its phones, one for
+# its rounded coordinates and one for its currency, rounded price and rounded area.
+def make_blocks(houses, settings):
+    blocks = []
+    phone_columns = [column for column in houses.columns if column.startswith("phone_")]
+    if phone_columns:
+        phones = houses[phone_columns].reset_index(drop=True).stack()
+        phones = phones[phones.str.len() >= settings["min_phone_length"]]
+        phone_rows = pd.DataFrame({"row": phones.index.get_level_values(0), "phone": phones.values}).drop_duplicates()
+        row_values = phone_rows["row"].values
+        blocks += [("phone", row_values[positions]) for positions in phone_rows.groupby("phone").indices.values()]
+
+    decimals = settings["geo_decimals"]
+    geo = pd.DataFrame({"latitude": houses["latitude"].round(decimals).values,
+                        "longitude": houses["longitude"].round(decimals).values})
+    blocks += [("geo", rows) for rows in geo.groupby(["latitude", "longitude"]).indices.values()]
+
+    size = pd.DataFrame({"currency": houses["currency_code"].values,
+                         "price": get_price_bucket(houses["price_value"]).values,
+                         "area": (houses["area_m2"] / settings["area_bucket"]).round().values})
+    blocks += [("price_area", rows) for rows in size.groupby(["currency", "price", "area"]).indices.values()]
+    return [(kind, rows) for kind, rows in blocks if len(rows) > 1]
+
+
+# Fuzzy matching of every pair of rows of a block, with one numpy matrix per comparison. Two houses match when they
+# have the same currency and close prices, no known value (coordinates or area) tells them apart, and at least one of
+# phone, coordinates or area agrees. A phone is often the one of an agency with many houses at similar prices, so in
+# the same site it only counts together with the coordinates or the area.
+def match_block(kind, rows, data, settings):
+    price = data["price_value"][rows]
+    currency = data["currency_code"][rows]
+    area = data["area_m2"][rows]
+    latitude = data["latitude"][rows]
+    longitude = data["longitude"][rows]
+
+    with np.errstate(invalid="ignore"):
+        price_ok = ((currency[:, None] == currency[None, :]) & (currency[:, None] != "") &
+                    (np.abs(price[:, None] - price[None, :]) <=
+                     settings["price_tolerance"] * np.maximum(price[:, None], price[None, :])))
+
+        area_known = ~np.isnan(area[:, None]) & ~np.isnan(area[None, :])
+        area_ok = area_known & (np.abs(area[:, None] - area[None, :]) <=
+                                settings["area_tolerance"] * np.maximum(area[:, None], area[None, :]))
+
+        geo_known = ~np.isnan(latitude[:, None]) & ~np.isnan(latitude[None, :]) & \
+            ~np.isnan(longitude[:, None]) & ~np.isnan(longitude[None, :])
+        dx = (longitude[:, None] - longitude[None, :]) * np.cos(np.radians(latitude[:, None])) * METERS_PER_DEGREE
+        dy = (latitude[:, None] - latitude[None, :]) * METERS_PER_DEGREE
+        near = geo_known & (np.hypot(dx, dy) <= settings["max_distance"])
+
+    site = data["site"][rows]
+    if kind == "phone":
+        phone_ok = site[:, None] != site[None, :]
+    else:
+        phone = data["phone_0"][rows]
+        phone_ok = (phone[:, None] == phone[None, :]) & (phone[:, None] != "") & (site[:, None] != site[None, :])
+
+    match = price_ok & ~(area_known & ~area_ok) & ~(geo_known & ~near) & (phone_ok | area_ok | near)
+    first, second = np.nonzero(np.triu(match, 1))
+    return rows[first], rows[second]
+
+
+# Finds the same house published more than once, in one site or in several, in the results saved today. Each house
+# gets a cluster_id, shared with its duplicates, and the cluster_size. They are saved in
+# results/[date]/<result_filename>.csv.
+def find_duplicates(config, path, sites):
+    settings = config["dedup"]
+    directory = get_results_directory(path)
+    with metrics.timer("dedup_seconds", stage="load"):
+        frames = [load_site(directory, site, config[site]["result_filename"]) for site in sites]
+        frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        logger.info("No results to find duplicates")
+        return None
+    houses = pd.concat(frames, ignore_index=True, sort=False)
+    if "phone_0" not in houses:
+        houses["phone_0"] = None
+    phone_columns = [column for column in houses.columns if column.startswith("phone_")]
+    houses[phone_columns] = houses[phone_columns].fillna("")
+    houses["currency_code"] = houses["currency_code"].fillna("")
+
+    with metrics.timer("dedup_seconds", stage="match"):
+        data = {column: houses[column].to_numpy(dtype=float) for column in NUMERIC_COLUMNS}
+        data.update({column: houses[column].to_numpy(dtype=object) for column in ["site", "currency_code", "phone_0"]})
+        clusters = UnionFind(len(houses))
+        blocks = Counter()
+        pairs = Counter()
+        for kind, rows in make_blocks(houses, settings):
+            if len(rows) > settings["max_block_size"]:
+                blocks[kind, "skipped"] += 1
+                continue
+            blocks[kind, "compared"] += 1
+            pairs["compared"] += len(rows) * (len(rows) - 1) // 2
+            first, second = match_block(kind, rows, data, settings)
+            pairs["matched"] += len(first)
+            for i, j in zip(first.tolist(), second.tolist()):
+                clusters.union(i, j)
+    for (kind, result), count in blocks.items():
+        metrics.inc("dedup_blocks_total", count, kind=kind, result=result)
+    for result, count in pairs.items():
+        metrics.inc("dedup_pairs_total", count, result=result)
+
+    roots = [clusters.find(i) for i in range(len(houses))]
+    houses.insert(0, "cluster_id", pd.factorize(pd.Series(roots))[0])
+    houses.insert(1, "cluster_size", houses.groupby("cluster_id")["cluster_id"].transform("size"))
+    houses = houses.sort_values(["cluster_size", "cluster_id"], ascending=[False, True], kind="mergesort")
+    filename = directory + "/{}.csv".format(settings["result_filename"])
+    houses.to_csv(filename, index=False, encoding="UTF-8")
+    duplicated = houses[houses["cluster_size"] > 1]
+    logger.info("Found {} houses in {} clusters of duplicates, of {} houses, in [{}]".format(
+        len(duplicated), duplicated["cluster_id"].nunique(), len(houses), filename))
+    return houses
@@ -0,0 +1,61 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue
+from threading import Thread
+
+END_OF_ITEMS = object()
+
+
+def unique(items):
+    seen = set()
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            yield item
+
+
+def fetch_all(fetch, items, workers=1):
+    if workers <= 1:
+        for item in items:
+            yield item, fetch(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        in_flight = deque()
+        for item in items:
+            in_flight.append((item, executor.submit(fetch, item)))
+            if len(in_flight) >= workers * 2:
+                item, future = in_flight.popleft()
+                yield item, future.result()
+        while in_flight:
+            item, future = in_flight.popleft()
+            yield item, future.result()
+
+
+def run_pipeline(fetch, items, workers=1, queue_size=1000):
+    discovered = Queue(maxsize=queue_size)
+    errors = []
+
+    def produce():
+        try:
+            for item in items:
+                discovered.put(item)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            discovered.put(END_OF_ITEMS)
+
+    def consume():
+        while True:
+            item = discovered.get()
+            if item is END_OF_ITEMS:
+                break
+            yield item
+        if errors:
+            raise errors[0]
+
+    producer = Thread(target=produce, daemon=True)
+    producer.start()
+    for item, result in fetch_all(fetch, consume(), workers):
+        yield item, result
+    producer.join()
@@ -0,0 +1,85 @@
+from threading import local
+from time import time
+
+from bs4.dammit import EncodingDetector
+from lxml import etree, html
+
+from metrics import metrics
+
+# lxml parsers can not be shared between threads.
+parsers = local()
+
+
+# XPath condition for an element having the css class name.
+def has_class(name):
+    return "contains(concat(' ', normalize-space(@class), ' '), ' {} ')".format(name)
+
+
+# Returns the lxml tree of the page, or None if it is not html. Pages that do not declare their encoding are read
+# as UTF-8 (lxml would read them as latin-1).
+def parse_document(content):
+    encoding = EncodingDetector.find_declared_encoding(content, is_html=True) or "utf-8"
+    thread_parsers = parsers.__dict__
+    if encoding not in thread_parsers:
+        thread_parsers[encoding] = html.HTMLParser(encoding=encoding)
+    try:
+        return html.fromstring(content, parser=thread_parsers[encoding])
+    except (etree.ParserError, LookupError, ValueError):
+        return None
+
+
+# A value of the page. xpath is relative to its section (the whole page if it has none). With many, the value is the
+# list of every match; otherwise the first match, or None. Elements are turned into their text; clean is applied to
+# each found value. With parts (xpaths relative to each match), each match is instead the tuple of the text of the
+# first result of each part, or None, so values that belong together are read from the same element.
+class Field:
+    def __init__(self, name, xpath, section=None, many=False, clean=None, parts=None):
+        self.name = name
+        self.xpath = xpath
+        self.section = section
+        self.many = many
+        self.clean = clean
+        self.parts = parts or []
+
+
+# The fields of a site, with their XPaths compiled once. Each section (an element holding several fields) is found
+# once per page and its fields are searched only inside it. The time and the misses of each field are counted in
+# the metrics (field_seconds, fields_total).
+class ExtractionSpec:
+    def __init__(self, site, sections, fields):
+        self.site = site
+        self.sections = [(name, etree.XPath(xpath, smart_strings=False)) for name, xpath in sections.items()]
+        self.fields = [(field, etree.XPath(field.xpath, smart_strings=False),
+                        [etree.XPath(part, smart_strings=False) for part in field.parts]) for field in fields]
+
+    def get_text(self, item):
+        return item.text_content() if isinstance(item, etree._Element) else str(item)
+
+    def get_value(self, field, parts, result):
+        if not isinstance(result, list):
+            result = [result]
+        if parts:
+            values = [tuple(self.get_text(found[0]) if found else None for found in (part(item) for part in parts))
+                      for item in result]
+        else:
+            values = [self.get_text(item) for item in result]
+        if field.clean is not None:
+            values = [field.clean(value) for value in values]
+        if field.many:
+            return values
+        return values[0] if values else None
+
+    def extract(self, document):
+        sections = {}
+        for name, xpath in self.sections:
+            result = xpath(document)
+            sections[name] = result[0] if result else None
+        values = {}
+        for field, xpath, parts in self.fields:
+            start = time()
+            base = sections[field.section] if field.section else document
+            value = self.get_value(field, parts, xpath(base) if base is not None else [])
+            values[field.name] = value
+            metrics.observe("field_seconds", time() - start, site=self.site, field=field.name)
+            metrics.inc("fields_total", site=self.site, field=field.name, result="hit" if value else "miss")
+        return values
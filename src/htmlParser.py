@@ -0,0 +1,58 @@
+import logging
+
+from bs4 import BeautifulSoup, FeatureNotFound, SoupStrainer
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+fh = logging.FileHandler('logs/htmlParser.log')
+fh.setLevel(logging.INFO)
+formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
+fh.setFormatter(formatter)
+logger.addHandler(fh)
+
+FALLBACK_PARSER = "html.parser"
+
+
+def has_attr_value(attrs, attr, value):
+    attr_value = attrs.get(attr)
+    if attr_value is None:
+        return False
+    values = attr_value if isinstance(attr_value, list) else attr_value.split()
+    return value in values
+
+
+# Keeps only the elements matching one of the (tag name, {attribute: value}) pairs, with their children.
+# A None tag name matches any tag. The strainer is asked about each tag with its name and attributes: by search_tag
+# before beautifulsoup4 4.13 and by allow_tag_creation since then (a callable name is only given the tag name there).
+class ElementsStrainer(SoupStrainer):
+    def __init__(self, elements):
+        super().__init__()
+        self.elements = elements
+
+    def matches(self, name, attrs):
+        if attrs is None:
+            attrs = {}
+        for element_name, element_attrs in self.elements:
+            if element_name is not None and element_name != name:
+                continue
+            if all(has_attr_value(attrs, attr, value) for attr, value in element_attrs.items()):
+                return True
+        return False
+
+    def search_tag(self, markup_name=None, markup_attrs={}):
+        return markup_name if self.matches(markup_name, markup_attrs) else None
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        return self.matches(name, attrs)
+
+
+def only_elements(*elements):
+    return ElementsStrainer(elements)
+
+
+def parse_html(content, parser="lxml", parse_only=None):
+    try:
+        return BeautifulSoup(content, parser, parse_only=parse_only)
+    except FeatureNotFound:
+        logger.error("Parser [{}] is not installed, using [{}]".format(parser, FALLBACK_PARSER))
+        return BeautifulSoup(content, FALLBACK_PARSER, parse_only=parse_only)
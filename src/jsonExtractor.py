@@ -0,0 +1,59 @@
+import json
+
+LIST_POSTINGS_START = b"listPostings = "
+LIST_POSTINGS_END = b"const developmentData "
+WHITESPACE = " \t\n\r"
+
+
+def find_json_blob(content, start_marker, end_marker=None):
+    start = content.find(start_marker)
+    if start < 0:
+        return None
+    start += len(start_marker)
+    end = content.find(end_marker, start) if end_marker else -1
+    if end < 0:
+        return None
+    return content[start:end].rstrip().rstrip(b";")
+
+
+# Raises ValueError if the text is not a json array or it is cut before its end.
+def iter_json_array(text):
+    decoder = json.JSONDecoder()
+    index = len(text) - len(text.lstrip(WHITESPACE))
+    if not text.startswith("[", index):
+        raise ValueError("Not a json array: [{}]".format(text[index:index + 20]))
+    index += 1
+    while True:
+        while index < len(text) and (text[index] in WHITESPACE or text[index] == ","):
+            index += 1
+        if index >= len(text):
+            raise ValueError("Truncated json array")
+        if text[index] == "]":
+            return
+        item, index = decoder.raw_decode(text, index)
+        yield item
+
+
+# Raises ValueError if the page has no listPostings array or it can not be decoded.
+def iter_list_postings(content):
+    blob = find_json_blob(content, LIST_POSTINGS_START, LIST_POSTINGS_END)
+    if blob is not None:
+        text = blob.decode("UTF-8")
+    else:
+        # Without the end marker the array is decoded straight from the rest of the page
+        start = content.find(LIST_POSTINGS_START)
+        if start < 0:
+            raise ValueError("listPostings not found")
+        text = content[start + len(LIST_POSTINGS_START):].decode("UTF-8", errors="replace")
+    for posting in iter_json_array(text):
+        yield posting
+
+
+def extract_list_postings(content):
+    blob = find_json_blob(content, LIST_POSTINGS_START, LIST_POSTINGS_END)
+    if blob is not None:
+        postings = json.loads(blob)
+        if not isinstance(postings, list):
+            raise ValueError("listPostings is not a list")
+        return postings
+    return list(iter_list_postings(content))
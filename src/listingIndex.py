@@ -0,0 +1,60 @@
+import datetime
+import hashlib
+import sqlite3
+from threading import Lock
+
+
+def make_fingerprint(*values):
+    text = "|".join(" ".join(str(value).split()) for value in values if value is not None)
+    return hashlib.sha1(text.encode("UTF-8")).hexdigest()
+
+
+class ListingIndex:
+    def __init__(self, filename):
+        self.lock = Lock()
+        self.connection = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS listings (
+                site TEXT NOT NULL,
+                listing_id TEXT NOT NULL,
+                fingerprint TEXT,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                PRIMARY KEY (site, listing_id)
+            )
+        """)
+        self.connection.commit()
+
+    def filter_changed(self, site, records):
+        today = datetime.date.today().isoformat()
+        with self.lock:
+            changed = []
+            unchanged = []
+            for record in records:
+                row = self.connection.execute("SELECT fingerprint FROM listings WHERE site = ? AND listing_id = ?",
+                                              (site, str(record["listing_id"]))).fetchone()
+                if row is not None and row[0] == record["fingerprint"]:
+                    unchanged.append((today, site, str(record["listing_id"])))
+                else:
+                    changed.append(record)
+            self.connection.executemany("UPDATE listings SET last_seen = ? WHERE site = ? AND listing_id = ?",
+                                        unchanged)
+            self.connection.commit()
+        return changed
+
+    def record_many(self, site, listings):
+        today = datetime.date.today().isoformat()
+        rows = [(site, str(listing_id), fingerprint, today, today) for listing_id, fingerprint in listings]
+        with self.lock:
+            self.connection.executemany("""
+                INSERT INTO listings (site, listing_id, fingerprint, first_seen, last_seen)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (site, listing_id) DO UPDATE SET
+                    fingerprint = excluded.fingerprint,
+                    last_seen = excluded.last_seen
+            """, rows)
+            self.connection.commit()
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,126 @@
+import datetime
+import json
+import sqlite3
+from threading import Lock
+
+# For each site, the record keys where the indexed columns are found, in order of preference.
+SITE_FIELDS = {
+    "lavoz": {
+        "listing_id": ["article_id"],
+        "price": ["precio", "price"],
+        "currency": ["moneda", "currency"],
+        "publication_date": ["recs:publishtime", "article:published_time"],
+        "url": ["url"],
+    },
+    "meli": {
+        "listing_id": ["id"],
+        "price": ["price"],
+        "currency": ["currency"],
+        "publication_date": [],
+        "url": ["link"],
+    },
+    "olx": {
+        "listing_id": ["id"],
+        "price": ["amount"],
+        "currency": ["preCurrency"],
+        "publication_date": ["date"],
+        "url": ["link"],
+    },
+    "zonaprop": {
+        "listing_id": ["postingId"],
+        "price": ["price"],
+        "currency": ["price_currency"],
+        "publication_date": ["publication_date"],
+        "url": ["url"],
+    },
+}
+
+
+def get_field(record, keys):
+    for key in keys:
+        if record.get(key) not in (None, ""):
+            return record[key]
+    return None
+
+
+# Prices come as numbers or as text like "1.500.000" or "95.000,50".
+def to_price(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    try:
+        return float(str(value).strip().replace(".", "").replace(",", "."))
+    except ValueError:
+        return None
+
+
+# Dates like "21/3/2020" are saved as "2020-03-21", so they can be sorted and compared.
+def to_date(value):
+    if value is None:
+        return None
+    try:
+        return datetime.datetime.strptime(str(value), "%d/%m/%Y").date().isoformat()
+    except ValueError:
+        return str(value)
+
+
+class ListingStore:
+    def __init__(self, filename, batch_size=500):
+        self.batch_size = batch_size
+        self.lock = Lock()
+        self.connection = sqlite3.connect(filename, timeout=30, check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS houses (
+                site TEXT NOT NULL,
+                listing_id TEXT NOT NULL,
+                price REAL,
+                currency TEXT,
+                publication_date TEXT,
+                url TEXT,
+                data TEXT NOT NULL,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL,
+                PRIMARY KEY (site, listing_id)
+            )
+        """)
+        self.connection.execute("CREATE INDEX IF NOT EXISTS houses_price ON houses (price)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS houses_publication_date ON houses (publication_date)")
+        self.connection.commit()
+
+    def to_row(self, site, record, today):
+        fields = SITE_FIELDS[site]
+        listing_id = get_field(record, fields["listing_id"])
+        if listing_id is None:
+            return None
+        return (site,
+                str(listing_id),
+                to_price(get_field(record, fields["price"])),
+                get_field(record, fields["currency"]),
+                to_date(get_field(record, fields["publication_date"])),
+                get_field(record, fields["url"]),
+                json.dumps(record, default=str, ensure_ascii=False),
+                today,
+                today)
+
+    # Saves the records in one transaction. A house already saved keeps its first_seen date.
+    def upsert_many(self, site, records):
+        today = datetime.date.today().isoformat()
+        rows = [row for row in (self.to_row(site, record, today) for record in records) if row is not None]
+        with self.lock:
+            with self.connection:
+                self.connection.executemany("""
+                    INSERT INTO houses (site, listing_id, price, currency, publication_date, url, data,
+                                        first_seen, last_seen)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (site, listing_id) DO UPDATE SET
+                        price = excluded.price,
+                        currency = excluded.currency,
+                        publication_date = excluded.publication_date,
+                        url = excluded.url,
+                        data = excluded.data,
+                        last_seen = excluded.last_seen
+                """, rows)
+        return len(rows)
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
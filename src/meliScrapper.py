@@ -1,13 +1,12 @@
-import datetime
-from bs4 import BeautifulSoup
-import pandas as pd
-import os
+from time import time
 import logging
 import re
-from bs4 import Tag
 
-from progressBarPrinter import print_progress_bar
-from utils import get_formated_telephone
+from htmlParser import only_elements
+from fieldExtractor import ExtractionSpec, Field, has_class, parse_document
+from scrapperEngine import ScrapperEngine, get_cards
+from listingIndex import make_fingerprint
+from metrics import metrics
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -17,201 +16,86 @@ formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
 fh.setFormatter(formatter)
 logger.addHandler(fh)
 
-
-class MeliScrapper:
-    def __init__(self, config, request_getter, path):
-        self.from_page = config["from_page"]
-        self.pages = config["pages"]
-        self.publisher_types = config["publisher_types"]
-        self.operation_types = config["operation_types"]
-        self.ids_filename = config["ids_filename"]
-        self.result_filename = config["result_filename"]
-        self.request_getter = request_getter
-        self.path = path
-        self.ids_directory = self.path + "/ids_to_search/meli"
-
-        print("----------------------")
-        print("MELI SCRAPPER CONFIGURATION:")
-        print("page from: {}".format(self.from_page))
-        print("pages: {}".format(self.pages))
-        print("publishers types: {}".format(self.publisher_types))
-        print("id filename prefix: {}".format(self.ids_filename))
-        print("result filename prefix: {}".format(self.result_filename))
-        print("----------------------")
-
-    def get(self, url):
-        response = self.request_getter.get(url)
-        return BeautifulSoup(response.content, 'html.parser') if response is not None else response
-
-    def scrap_ids(self):
-        logger.info("Start scrap_ids")
-        print("Start Mercado libre scrapping")
-        for publisher_type in self.publisher_types:
-            for operation_type in self.operation_types:
-                print("Start {}-{} id scrapping".format(publisher_type, operation_type))
-                houses_urls_df = pd.DataFrame()
-                print_progress_bar(0, self.from_page + self.pages, "{}-{} ids".format(publisher_type, operation_type))
-
-                for i in range(self.from_page, self.from_page + self.pages):
-
-                    page_part_number = 48 * (i - 1) + 1
-
-                    page_part = "_Desde_" + str(page_part_number)
-
-                    search_url_inmu = \
-                        'https://inmuebles.mercadolibre.com.ar/{operation_type}/{publisher_type}/{page_part}'.format(
-                            publisher_type=publisher_type, page_part=page_part, operation_type=operation_type)
-
-                    response_soup = self.get(search_url_inmu)
-                    house_list = response_soup.find_all("a", {"class": "item__info-link"})
-                    house_urls = list(set(house_item.get("href") for house_item in house_list))
-                    house_processed = [False for house in house_urls]
-                    houses_info = pd.DataFrame({
-                        "url": house_urls,
-                        "processed": house_processed
-                    })
-                    houses_urls_df = pd.concat([houses_urls_df, houses_info], axis=0, sort=False).reset_index().drop(
-                        columns="index")
-                    houses_urls_df.to_csv(
-                        self.path + "/temp/temp_{}_{}_{}.csv".format(publisher_type, operation_type, self.ids_filename),
-                        index=False,
-                        encoding="UTF-8")
-
-                    print_progress_bar(i + 1, self.from_page + self.pages,
-                                       "{}-{} ids".format(publisher_type, operation_type))
-                    if not os.path.exists(self.ids_directory):
-                        os.makedirs(self.ids_directory)
-
-                    houses_urls_df.to_csv(
-                        "{directory}/{name}_{publisher_type}_{operation_type}_ids.csv".format(
-                            directory=self.ids_directory,
-                            name=self.ids_filename,
-                            publisher_type=publisher_type,
-                            operation_type=operation_type
-                        ),
-                        index=False,
-                        encoding="UTF-8")
-                print("")
-                print("End {}-{} id scrapping".format(publisher_type, operation_type))
-        print("End Mercado Libre ID Scrapping")
-        logger.info("End scrap_ids")
-
-    def get_data(self, base, content_lists):
-        index = content_lists.pop(0)
-        try:
-            if content_lists:
-                data = self.get_data(base[index].contents, content_lists)
-            else:
-                data = base[index]
-        except:
-            return None
-
-        return data
-
-    def get_lat_long(self, response_house):
+SEARCH_ELEMENTS = only_elements(("a", {"class": "item__info-link"}))
+GOOGLE_MAP_URL = 'https://maps.googleapis.com/maps/api/staticmap?center='
+HOUSE_SPEC = ExtractionSpec("meli", {
+    "short_description": "//section[{}]".format(has_class("short-description--static")),
+    "seller": "//section[{}]".format(has_class("vip-section-seller-info")),
+}, [
+    Field("shortDescription", ".//h1/text()[1]", "short_description", clean=str.strip),
+    Field("currency", "(.//span)[1]/*[1]/text()[1]", "short_description"),
+    Field("price", "(.//span)[1]/*[2]/text()[1]", "short_description"),
+    Field("size", "(.//dl)[2]/*[2]/text()[1]", "short_description"),
+    Field("rooms", "(.//dl)[3]/*[2]/text()[1]", "short_description"),
+    Field("bathrooms", "(.//dl)[4]/*[2]/text()[1]", "short_description"),
+    Field("name", "*[3]/*[1]/text()[1]", "seller"),
+    Field("phones", ".//span[{}]".format(has_class("profile-info-phone-value")), "seller", many=True),
+    Field("address", "//h2[{}]/text()[1]".format(has_class("map-address"))),
+    Field("location", "//h3[{}]/text()[1]".format(has_class("map-location"))),
+    Field("description", "(//div[{}]//p)[1]".format(has_class("item-description__text")),
+          clean=lambda text: text.replace('<br>', '')),
+    Field("map_script", "//script[contains(., '{}')]/text()".format(GOOGLE_MAP_URL)),
+    Field("specs", "//ul[{}]/li[.//strong and .//span]".format(has_class("specs-list")), many=True,
+          parts=[".//strong[1]", ".//span[1]"], clean=lambda spec: (spec[0].replace(' ', '_'), spec[1])),
+])
+
+
+class MeliScrapper(ScrapperEngine):
+    site = "meli"
+    title = "Mercado Libre"
+    search_elements = SEARCH_ELEMENTS
+
+    def get_search_url(self, scope, page):
+        publisher_type, operation_type = scope
+        page_part = "_Desde_" + str(48 * (page - 1) + 1)
+        return 'https://inmuebles.mercadolibre.com.ar/{operation_type}/{publisher_type}/{page_part}'.format(
+            publisher_type=publisher_type, page_part=page_part, operation_type=operation_type)
+
+    def extract_search(self, response_soup):
+        return [(house_url, self.get_listing_id(house_url), make_fingerprint(house_card))
+                for house_url, house_card in get_cards(response_soup, "item__info-link").items()]
+
+    def get_listing_id(self, link):
+        item_id = re.search(r'MLA-?\d+', link)
+        return item_id.group(0).replace("-", "") if item_id else link
+
+    def get_lat_long(self, map_script):
         lat_long = ' %2C '
-        google_map_url = 'https://maps.googleapis.com/maps/api/staticmap?center='
-        for script in response_house.find_all('script'):
-            if google_map_url in script.get_text():
-                lat_long = \
-                    script.get_text().split(google_map_url)[1].split('&zoom')[0]
+        if map_script:
+            lat_long = map_script.split(GOOGLE_MAP_URL)[1].split('&zoom')[0]
 
         return tuple(lat_long.split('%2C'))
 
+    # The page is read with the compiled HOUSE_SPEC; a page without its short description is not a house.
     def get_house_info(self, link):
         logger.info("Start get_house_info")
-        response_house = self.get(link)
+        response = self.request_getter.get(link)
         info = {}
-        if response_house:
-            short_description = response_house.find("section", {"class": "short-description--static"})
-
-            info['shortDescription'] = self.get_data(short_description.find("h1").contents, [0]).strip()
-            info['type'] = link[8:].split('.')[0]
-            info['currency'] = self.get_data(short_description.find("span").contents, [1, 0])
-            info['price'] = self.get_data(short_description.find("span").contents, [3, 0])
-            info['size'] = self.get_data(short_description.find_all("dl"), [1, 2, 0])
-            info['rooms'] = self.get_data(short_description.find_all("dl"), [2, 2, 0])
-            info['bathrooms'] = self.get_data(short_description.find_all("dl"), [3, 2, 0])
-            info['link'] = link
-
-            section_view_more = response_house.find("section", {"class": "vip-section-seller-info"})
-
-            info['name'] = self.get_data(section_view_more.contents, [5, 1, 0])
-
-            for i, phone in enumerate(section_view_more.find_all("span", {"class": "profile-info-phone-value"})):
-                info['phone_{}'.format(i)] = phone.get_text()
-                info['phone_{}_formated'.format(i)] = get_formated_telephone(phone.get_text())
-
-            info['address'] = self.get_data(response_house.find("h2", {"class": "map-address"}).contents, [0])
-            info['location'] = self.get_data(response_house.find("h3", {"class": "map-location"}).contents, [0])
-
-            try:
-                info['description'] = response_house.find("div", {"class": "item-description__text"}).find(
-                    "p").get_text().replace('<br>', '')
-            except:
-                info['description'] = ""
-
-            info['latitude'], info['longitude'] = self.get_lat_long(response_house)
-
-            spec_items = response_house.find("ul", {"class": "specs-list"})
-            if spec_items:
-                for spec_item in spec_items.children:
-                    if isinstance(spec_item, Tag):
-                        info[spec_item.find('strong').get_text().replace(' ', '_')] = spec_item.find('span').get_text()
-
+        start = time()
+        if response is not None and response.ok:
+            with metrics.timer("parse_seconds", site="meli"):
+                document = parse_document(response.content)
+            start = time()
+            values = HOUSE_SPEC.extract(document) if document is not None else {}
+            if values.get('shortDescription') is not None:
+                info['shortDescription'] = values['shortDescription']
+                info['type'] = link[8:].split('.')[0]
+                for field in ['currency', 'price', 'size', 'rooms', 'bathrooms']:
+                    info[field] = values[field]
+                info['link'] = link
+                info['id'] = self.get_listing_id(link)
+                info['name'] = values['name']
+
+                for i, phone in enumerate(values['phones']):
+                    info['phone_{}'.format(i)] = phone
+
+                info['address'] = values['address']
+                info['location'] = values['location']
+                info['description'] = values['description'] or ""
+                info['latitude'], info['longitude'] = self.get_lat_long(values['map_script'])
+                info.update(values['specs'])
+
+        metrics.observe("extract_seconds", time() - start, site="meli")
+        metrics.inc("houses_total", site="meli", result="ok" if info else "empty")
         logger.info("End get_house_info")
         return info
-
-    def houses_id_info(self):
-        logger.info("Start houses_id_info")
-        print("Start Mercado Libre houses info Scrapping")
-        for publisher_type in self.publisher_types:
-            for operation_type in self.operation_types:
-                print("Start {}-{} houses info Scrapping".format(publisher_type, operation_type))
-                houses_df = pd.DataFrame()
-                houses_urls_df = pd.read_csv("{directory}/{name}_{publisher_type}_{operation_type}_ids.csv".format(
-                    directory=self.ids_directory,
-                    name=self.ids_filename,
-                    publisher_type=publisher_type,
-                    operation_type=operation_type
-                ))
-                houses_urls_df.drop_duplicates(subset="url", keep="first", inplace=True)
-                i = 0
-                total_rows = houses_urls_df.shape[0]
-                print_progress_bar(i, total_rows, publisher_type + " " + str(i))
-                for row in houses_urls_df.itertuples():
-                    i += 1
-                    house_info = self.get_house_info(row.url)
-                    house_info_df = pd.DataFrame([house_info], columns=house_info.keys())
-                    houses_urls_df.loc[row.Index, 'processed'] = True
-                    houses_df = pd.concat([houses_df, house_info_df], axis=0, sort=False).reset_index().drop(
-                        columns="index")
-                    if i % 5 == 0:
-                        houses_df.to_csv(
-                            self.path + "/temp/temp_{}_{}_{}.csv".format(self.result_filename, publisher_type,
-                                                                         operation_type),
-                            index=False, encoding="UTF-8")
-                        houses_urls_df.to_csv(
-                            self.path + "/temp/temp_{}_{}_{}_ids.csv".format(self.result_filename, publisher_type,
-                                                                             operation_type),
-                            index=False, encoding="UTF-8")
-                    print_progress_bar(i, total_rows, publisher_type + "-" + operation_type + " " + str(i))
-
-                directory = self.path + "/results/" + datetime.datetime.today().strftime('%Y-%m-%d')
-                if not os.path.exists(directory):
-                    os.makedirs(directory)
-                houses_df.to_csv(
-                    directory + "/{}_{}_{}.csv".format(self.result_filename, publisher_type, operation_type),
-                    index=False,
-                    encoding="UTF-8")
-                houses_urls_df.to_csv("{directory}/{name}_{publisher_type}_{operation_type}_ids.csv".format(
-                    directory=self.ids_directory,
-                    name=self.ids_filename,
-                    publisher_type=publisher_type,
-                    operation_type=operation_type),
-                    index=False)
-                print("")
-                print("End {} houses info Scrapping".format(publisher_type))
-
-        logger.info("End houses_id_info")
-        print("End Mercado Libre houses info Scrapping")
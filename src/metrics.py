@@ -0,0 +1,178 @@
+import json
+import logging
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from threading import Lock, Thread, Event
+from time import time
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+fh = logging.FileHandler('logs/metrics.log')
+fh.setLevel(logging.INFO)
+formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
+fh.setFormatter(formatter)
+logger.addHandler(fh)
+
+# Upper limits, in seconds, of the histogram buckets.
+BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
+
+
+def get_key(name, labels):
+    return name + "{" + ",".join('{}="{}"'.format(label, value) for label, value in sorted(labels.items())) + "}"
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(BUCKETS) and value > BUCKETS[index]:
+            index += 1
+        self.buckets[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def merge(self, report):
+        self.buckets = [count + other for count, other in zip(self.buckets, report["buckets"])]
+        self.count += report["count"]
+        self.sum += report["sum"]
+        self.max = max(self.max, report["max"])
+
+    def as_dict(self):
+        return {"count": self.count,
+                "sum": round(self.sum, 6),
+                "mean": round(self.sum / self.count, 6) if self.count else 0,
+                "max": round(self.max, 6),
+                "buckets": self.buckets}
+
+
+# Counters and latency histograms, identified by a name and labels (e.g. site, host). They are shared by the whole
+# process through the metrics instance below.
+class Metrics:
+    def __init__(self):
+        self.lock = Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.labels = {}
+        self.started = time()
+        self.stop_reporter = None
+
+    def reset(self):
+        with self.lock:
+            self.counters = {}
+            self.histograms = {}
+            self.labels = {}
+            self.started = time()
+
+    def inc(self, name, value=1, **labels):
+        key = get_key(name, labels)
+        with self.lock:
+            self.labels[key] = (name, labels)
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = get_key(name, labels)
+        with self.lock:
+            self.labels[key] = (name, labels)
+            if key not in self.histograms:
+                self.histograms[key] = Histogram()
+            self.histograms[key].observe(value)
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time()
+        try:
+            yield
+        finally:
+            self.observe(name, time() - start, **labels)
+
+    def get_report(self):
+        with self.lock:
+            return {"seconds": round(time() - self.started, 1),
+                    "counters": [{"name": self.labels[key][0], "labels": self.labels[key][1], "value": value}
+                                 for key, value in sorted(self.counters.items())],
+                    "histograms": [dict(histogram.as_dict(), name=self.labels[key][0], labels=self.labels[key][1])
+                                   for key, histogram in sorted(self.histograms.items())]}
+
+    # Adds the report of another process, e.g. a worker of the orchestrator.
+    def merge_report(self, report):
+        for counter in report["counters"]:
+            self.inc(counter["name"], counter["value"], **counter["labels"])
+        for histogram_report in report["histograms"]:
+            key = get_key(histogram_report["name"], histogram_report["labels"])
+            with self.lock:
+                self.labels[key] = (histogram_report["name"], histogram_report["labels"])
+                if key not in self.histograms:
+                    self.histograms[key] = Histogram()
+                self.histograms[key].merge(histogram_report)
+
+    def get_summary(self):
+        with self.lock:
+            parts = ["{} {}".format(key, value) for key, value in sorted(self.counters.items())]
+            parts += ["{} count:{} mean:{:.3f}s max:{:.3f}s".format(key, histogram.count,
+                                                                    histogram.sum / histogram.count, histogram.max)
+                      for key, histogram in sorted(self.histograms.items()) if histogram.count]
+        return " | ".join(parts)
+
+    def to_prometheus(self):
+        lines = []
+        with self.lock:
+            for key, value in sorted(self.counters.items()):
+                lines.append("proppi_{} {}".format(key.replace("{}", ""), value))
+            for key, histogram in sorted(self.histograms.items()):
+                name, labels = self.labels[key]
+                cumulative = 0
+                for limit, count in zip(BUCKETS + ["+Inf"], histogram.buckets):
+                    cumulative += count
+                    lines.append("proppi_{} {}".format(get_key(name + "_bucket", dict(labels, le=limit)), cumulative))
+                lines.append("proppi_{} {}".format(get_key(name + "_sum", labels).replace("{}", ""), histogram.sum))
+                lines.append("proppi_{} {}".format(get_key(name + "_count", labels).replace("{}", ""),
+                                                   histogram.count))
+        return "\n".join(lines) + "\n"
+
+    def start_reporter(self, interval):
+        if interval <= 0:
+            return
+        self.stop_reporter = Event()
+
+        def report():
+            while not self.stop_reporter.wait(interval):
+                logger.info("Metrics: {}".format(self.get_summary()))
+
+        Thread(target=report, daemon=True).start()
+
+    def start_prometheus(self, port):
+        if port <= 0:
+            return
+        current_metrics = self
+
+        class PrometheusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = current_metrics.to_prometheus().encode("UTF-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = HTTPServer(("", port), PrometheusHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        logger.info("Prometheus metrics in port [{}]".format(port))
+
+    def save_report(self, filename):
+        if self.stop_reporter is not None:
+            self.stop_reporter.set()
+        logger.info("Metrics: {}".format(self.get_summary()))
+        with open(filename, "w") as report_file:
+            json.dump(self.get_report(), report_file, indent=2)
+
+
+metrics = Metrics()
@@ -0,0 +1,105 @@
+import re
+
+import pandas as pd
+
+from metrics import metrics
+
+# Numbers like "1.500.000", "95.000,50", "250 m²" or "-31.41".
+NUMBER = re.compile(r"(-?\d{1,3}(?:\.\d{3})+(?:,\d+)?|-?\d+(?:[.,]\d+)?)")
+THOUSANDS = re.compile(r"-?\d{1,3}(?:\.\d{3})+(?:,\d+)?")
+NOT_PHONE = re.compile(r"[^0-9/]")
+LEADING_ZERO = re.compile(r"^0")
+COUNTRY_CODE = re.compile(r"^549")
+CURRENCIES = {"U$S": "USD", "US$": "USD", "U$D": "USD", "USD": "USD", "$": "ARS", "ARS": "ARS"}
+
+# For each site, the columns where each normalized value is found, in order of preference, and the pattern of the
+# phone columns. Each phone column gets a "_formated" column.
+SITE_COLUMNS = {
+    "lavoz": {
+        "price_value": ["precio", "price"],
+        "currency_code": ["moneda", "currency"],
+        "phones": re.compile(r"^telephone$"),
+    },
+    "meli": {
+        "price_value": ["price"],
+        "currency_code": ["currency"],
+        "area_m2": ["Superficie_total", "size"],
+        "rooms_count": ["Ambientes", "rooms"],
+        "latitude": ["latitude"],
+        "longitude": ["longitude"],
+        "phones": re.compile(r"^phone_\d+$"),
+    },
+    "olx": {
+        "price_value": ["amount"],
+        "currency_code": ["preCurrency"],
+        "latitude": ["latitude"],
+        "longitude": ["longitude"],
+        "phones": re.compile(r"^phone$"),
+    },
+    "zonaprop": {
+        "price_value": ["price"],
+        "currency_code": ["price_currency"],
+        "area_m2": ["superficie_total", "superficie_cubierta"],
+        "rooms_count": ["ambientes", "dormitorios"],
+        "latitude": ["latitude"],
+        "longitude": ["longitude"],
+        "phones": re.compile(r"^contact_telefono$"),
+    },
+}
+
+
+# The first value that is not empty, of the columns in order of preference.
+def get_first(df, columns):
+    values = None
+    for column in [column for column in columns if column in df]:
+        column_values = df[column].where(df[column] != "")
+        values = column_values if values is None else values.fillna(column_values)
+    return values
+
+
+def to_number(values):
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    text = values.astype(str).str.extract(NUMBER, expand=False)
+    thousands = text.str.fullmatch(THOUSANDS).fillna(False).astype(bool)
+    text = text.where(~thousands, text.str.replace(".", "", regex=False))
+    return pd.to_numeric(text.str.replace(",", ".", regex=False), errors="coerce")
+
+
+def to_coordinate(values):
+    return pd.to_numeric(values, errors="coerce")
+
+
+def to_currency(values):
+    return values.astype(str).str.strip().str.upper().map(CURRENCIES)
+
+
+# The first phone of each value, only digits and without the leading 0 or 549.
+def format_phones(values):
+    text = values.fillna("").astype(str).str.replace(NOT_PHONE, "", regex=True)
+    text = text.str.replace(LEADING_ZERO, "", regex=True).str.replace(COUNTRY_CODE, "", regex=True)
+    return text.str.split("/").str[0]
+
+
+CONVERTERS = {"price_value": to_number,
+              "currency_code": to_currency,
+              "area_m2": to_number,
+              "rooms_count": to_number,
+              "latitude": to_coordinate,
+              "longitude": to_coordinate}
+
+
+# Adds the typed columns (price_value, currency_code, area_m2, rooms_count), turns the coordinates into floats and
+# formats the phones of a chunk of houses. Only the columns whose sources are in the chunk are added.
+def normalize(df, site):
+    if df.empty or site not in SITE_COLUMNS:
+        return df
+    with metrics.timer("normalize_seconds", site=site):
+        site_columns = SITE_COLUMNS[site]
+        for column, convert in CONVERTERS.items():
+            values = get_first(df, site_columns.get(column, []))
+            if values is not None:
+                df[column] = convert(values)
+        for column in [column for column in df.columns if site_columns["phones"].match(str(column))]:
+            df[column + "_formated"] = format_phones(df[column])
+    return df
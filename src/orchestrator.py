@@ -0,0 +1,330 @@
+import copy
+import datetime
+import logging
+import multiprocessing
+import os
+import socket
+import sys
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from logging.handlers import QueueHandler
+from threading import Event, Thread
+from time import time
+
+from progressBarPrinter import set_progress_sink
+from requestgetter import RequestGetter
+from lavozScrapper import LaVozScrapper
+from meliScrapper import MeliScrapper
+from zonapropScrapper import ZonapropScrapper
+from olxScrapper import OlxScrapper
+from scrapperEngine import get_scopes, get_scope_config
+from listingIndex import ListingIndex
+from listingStore import ListingStore
+from outputSink import merge_outputs, quarantine_outputs
+from shardQueue import ShardQueue
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+fh = logging.FileHandler('logs/orchestrator.log')
+fh.setLevel(logging.INFO)
+formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
+fh.setFormatter(formatter)
+logger.addHandler(fh)
+
+SITES = ["lavoz", "meli", "zonaprop", "olx"]
+SCRAPPERS = {"lavoz": LaVozScrapper, "meli": MeliScrapper, "zonaprop": ZonapropScrapper, "olx": OlxScrapper}
+END_OF_QUEUE = None
+
+
+def open_shared(config, path):
+    request_getter = RequestGetter(config['requests'])
+    listing_index = None
+    if config['listing_index']['enabled'].lower() == "true":
+        listing_index = ListingIndex(path + "/" + config['listing_index']['filename'])
+    listing_store = None
+    if config['listing_store']['enabled'].lower() == "true":
+        listing_store = ListingStore(path + "/" + config['listing_store']['filename'],
+                                     config['listing_store']['batch_size'])
+    return request_getter, listing_index, listing_store
+
+
+def close_shared(request_getter, listing_index, listing_store):
+    request_getter.close()
+    if listing_index is not None:
+        listing_index.close()
+    if listing_store is not None:
+        listing_store.close()
+
+
+def run_site(site, site_config, pipeline, path, request_getter, listing_index, listing_store):
+    scrapper = SCRAPPERS[site](site_config, request_getter, path, listing_index, listing_store)
+    if pipeline:
+        scrapper.scrap_pipeline()
+    else:
+        scrapper.scrap()
+
+
+def make_summary(name, start, request_getter, error=None):
+    summary = {"job": name,
+               "status": "error" if error else "ok",
+               "seconds": round(time() - start, 1),
+               "pool_stats": request_getter.get_pool_stats() if request_getter else {},
+               "cache_stats": request_getter.cache.get_stats() if request_getter and request_getter.cache else {}}
+    if error:
+        summary["error"] = error
+    return summary
+
+
+# Runs every site one after the other in this process, sharing the requests and storage.
+def run_sequential(config, path, sites, pipeline):
+    summaries = []
+    shared = open_shared(config, path)
+    for site in sites:
+        start = time()
+        error = None
+        try:
+            run_site(site, config[site], pipeline, path, *shared)
+        except Exception as e:
+            logger.error("Error scrapping {}: {}".format(site, traceback.format_exc()))
+            error = str(e)
+        summaries.append(make_summary(site, start, shared[0], error))
+    close_shared(*shared)
+    return summaries
+
+
+# One job for each site or, with shard, for each scope (publisher type, and operation type in Meli, or province in
+# OLX) of each site. The shards of the same site share its hosts, so their rate limits are divided between them.
+def make_jobs(config, sites, pipeline, path, shard):
+    jobs = []
+    for site in sites:
+        scopes = get_scopes(config[site]) if shard else [[]]
+        for scope in scopes:
+            job_config = copy.deepcopy(config)
+            if scope:
+                job_config[site] = get_scope_config(job_config[site], scope)
+            for rate_limit in job_config["requests"].get("rate_limits", {}).values():
+                rate_limit["requests_per_second"] = float(rate_limit["requests_per_second"]) / len(scopes)
+            name = "-".join([site] + scope)
+            jobs.append((name, run_job, (name, site, job_config, pipeline, path)))
+    return jobs
+
+
+# The loggers of the worker send their records to the parent, which writes them in the usual log files.
+def init_worker(log_queue, progress_queue, name):
+    for worker_logger in list(logging.Logger.manager.loggerDict.values()):
+        if isinstance(worker_logger, logging.Logger) and worker_logger.handlers:
+            worker_logger.handlers = [QueueHandler(log_queue)]
+    set_progress_sink(lambda value, end_value, message, start_value: progress_queue.put(
+        (name, value, end_value, message, start_value)))
+
+
+# The metrics of the worker are returned with the summaries, so the parent adds them to its own.
+def run_in_worker(name, target, args, log_queue, progress_queue):
+    init_worker(log_queue, progress_queue, name)
+    metrics.reset()
+    summaries = target(*args)
+    return summaries, metrics.get_report()
+
+
+def run_job(name, site, job_config, pipeline, path):
+    start = time()
+    shared = None
+    error = None
+    try:
+        shared = open_shared(job_config, path)
+        run_site(site, job_config[site], pipeline, path, *shared)
+    except Exception as e:
+        logger.error("Error scrapping {}: {}".format(name, traceback.format_exc()))
+        error = str(e)
+    summary = make_summary(name, start, shared[0] if shared else None, error)
+    if shared:
+        close_shared(*shared)
+    return [summary]
+
+
+def write_logs(log_queue):
+    while True:
+        record = log_queue.get()
+        if record is END_OF_QUEUE:
+            return
+        logging.getLogger(record.name).handle(record)
+
+
+def write_progress(progress_queue):
+    progress = {}
+    while True:
+        item = progress_queue.get()
+        if item is END_OF_QUEUE:
+            return
+        name, value, end_value, message, start_value = item
+        percent = (float(value) - float(start_value)) / max(float(end_value) - float(start_value), 1)
+        progress[name] = "{} {:.0f}%".format(message, percent * 100)
+        sys.stdout.write("\r " + " | ".join(progress[job] for job in sorted(progress)))
+
+
+# Runs each job in its own process. Progress and logs of every process are shown and written from this one.
+# A job is a (name, function, arguments) tuple; the function returns a list of summaries.
+def run_pool(jobs, processes):
+    logger.info("Start run_pool jobs:[{}] processes:[{}]".format([job[0] for job in jobs], processes))
+    manager = multiprocessing.Manager()
+    log_queue = manager.Queue()
+    progress_queue = manager.Queue()
+    log_writer = Thread(target=write_logs, args=(log_queue,), daemon=True)
+    progress_writer = Thread(target=write_progress, args=(progress_queue,), daemon=True)
+    log_writer.start()
+    progress_writer.start()
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=max(min(processes, len(jobs)), 1)) as executor:
+        futures = {executor.submit(run_in_worker, name, target, args, log_queue, progress_queue): name
+                   for name, target, args in jobs}
+        for future in as_completed(futures):
+            try:
+                job_summaries, job_metrics = future.result()
+                summaries.extend(job_summaries)
+                metrics.merge_report(job_metrics)
+            except Exception as e:
+                logger.error("Process of {} failed: {}".format(futures[future], e))
+                summaries.append({"job": futures[future], "status": "error", "error": str(e)})
+
+    log_queue.put(END_OF_QUEUE)
+    progress_queue.put(END_OF_QUEUE)
+    log_writer.join()
+    progress_writer.join()
+    manager.shutdown()
+    print("")
+    logger.info("End run_pool")
+    return sorted(summaries, key=lambda summary: summary["job"])
+
+
+def run_processes(config, path, sites, pipeline, processes, shard):
+    return run_pool(make_jobs(config, sites, pipeline, path, shard), processes)
+
+
+def get_shard_filename(filename, shard):
+    return "{}_shard{:05d}".format(filename, shard["from_page"])
+
+
+# Splits the pages of each scope of each site in shards of pages_per_shard
+# pages. The shard ids only depend on the configuration, so every process or host creates the same shards.
+def make_shards(config, sites, pages_per_shard):
+    shards = []
+    for site in sites:
+        site_config = config[site]
+        last_page = site_config["from_page"] + site_config["pages"]
+        for scope in get_scopes(site_config):
+            for from_page in range(site_config["from_page"], last_page, pages_per_shard):
+                shards.append({"shard_id": "{}-{}-{:05d}".format(site, "-".join(scope), from_page),
+                               "site": site,
+                               "scope": scope,
+                               "from_page": from_page,
+                               "pages": min(pages_per_shard, last_page - from_page)})
+    return shards
+
+
+def get_shard_config(config, shard):
+    site_config = get_scope_config(copy.deepcopy(config[shard["site"]]), shard["scope"])
+    site_config["from_page"] = shard["from_page"]
+    site_config["pages"] = shard["pages"]
+    site_config["result_filename"] = get_shard_filename(site_config["result_filename"], shard)
+    site_config["ids_filename"] = get_shard_filename(site_config["ids_filename"], shard)
+    return site_config
+
+
+def open_shard_queue(config, path):
+    return ShardQueue(path + "/" + config["partition"]["queue_filename"], config["partition"]["lease_seconds"])
+
+
+# The run_id of the configuration is shared by the processes and hosts that use it. Without one, each execution is a
+# new run named by its start time, or with resume it continues the last run that was not merged. A run already merged
+# is not run again.
+def get_run_id(config, queue):
+    run_id = config["partition"].get("run_id")
+    if not run_id and config["resume"].lower() == "true":
+        run_id = queue.get_last_run_id()
+    if not run_id:
+        run_id = datetime.datetime.now().strftime("%Y-%m-%dT%H-%M-%S")
+    if queue.is_merged(run_id):
+        logger.error("The run_id [{}] is already finished and merged".format(run_id))
+        raise ValueError("The run_id [{}] is already finished, use another run_id".format(run_id))
+    return run_id
+
+
+# Renews the lease of a shard three times in each lease_seconds until stopped, so a shard that takes longer than the
+# lease is not claimed by another process. It has its own connection because it runs in another thread.
+def renew_lease(config, path, run_id, shard_id, owner, stopped):
+    queue = open_shard_queue(config, path)
+    while not stopped.wait(queue.lease_seconds / 3.0):
+        if not queue.renew(run_id, shard_id, owner):
+            logger.error("Lease of shard [{}] lost by owner:[{}]".format(shard_id, owner))
+    queue.close()
+
+
+# Claims shards until there are no more left, from this or other processes or hosts.
+def work_shards(name, config, pipeline, path, run_id):
+    owner = "{}:{}:{}".format(socket.gethostname(), os.getpid(), name)
+    queue = open_shard_queue(config, path)
+    shared = open_shared(config, path)
+    summaries = []
+    shard = queue.claim(run_id, owner)
+    while shard is not None:
+        logger.info("Start shard [{}] owner:[{}]".format(shard["shard_id"], owner))
+        start = time()
+        error = None
+        stopped = Event()
+        heartbeat = Thread(target=renew_lease, args=(config, path, run_id, shard["shard_id"], owner, stopped),
+                           daemon=True)
+        heartbeat.start()
+        try:
+            run_site(shard["site"], get_shard_config(config, shard), pipeline, path, *shared)
+        except Exception as e:
+            logger.error("Error scrapping shard {}: {}".format(shard["shard_id"], traceback.format_exc()))
+            error = str(e)
+        stopped.set()
+        heartbeat.join()
+        queue.complete(run_id, shard["shard_id"], owner, error)
+        summaries.append(make_summary(shard["shard_id"], start, shared[0], error))
+        shard = queue.claim(run_id, owner)
+    close_shared(*shared)
+    queue.close()
+    return summaries
+
+
+# The outputs of the shards are merged in the order of their pages, so the result does not depend on which process
+# or host scrapped each shard. The outputs of the shards with errors are left out and moved to the failed_shards folder.
+def merge_shards(config, path, run_id, queue):
+    shards = queue.get_shards(run_id)
+    done_ids = set(shard["shard_id"] for shard in queue.get_shards(run_id, "done"))
+    for site in set(shard["site"] for shard in shards):
+        result_filename = config[site]["result_filename"]
+        for scope in get_scopes(config[site]):
+            scope_shards = [shard for shard in shards if shard["site"] == site and shard["scope"] == scope]
+            names = {shard["shard_id"]: "{}_{}".format(get_shard_filename(result_filename, shard), "_".join(scope))
+                     for shard in scope_shards}
+            merge_outputs(path, [names[shard["shard_id"]] for shard in scope_shards if shard["shard_id"] in done_ids],
+                          "{}_{}".format(result_filename, "_".join(scope)))
+            quarantine_outputs(path, [names[shard["shard_id"]] for shard in scope_shards
+                                      if shard["shard_id"] not in done_ids], "failed_shards")
+
+
+def run_partitioned(config, path, sites, pipeline, processes):
+    queue = open_shard_queue(config, path)
+    run_id = get_run_id(config, queue)
+    queue.add_shards(run_id, make_shards(config, sites, config["partition"]["pages_per_shard"]))
+    logger.info("Start run_partitioned run_id:[{}]".format(run_id))
+    if processes > 1:
+        worker_config = copy.deepcopy(config)
+        for rate_limit in worker_config["requests"].get("rate_limits", {}).values():
+            rate_limit["requests_per_second"] = float(rate_limit["requests_per_second"]) / processes
+        summaries = run_pool([("worker{}".format(i), work_shards,
+                               ("worker{}".format(i), worker_config, pipeline, path, run_id))
+                              for i in range(processes)], processes)
+    else:
+        summaries = work_shards("worker0", config, pipeline, path, run_id)
+
+    if queue.is_finished(run_id) and queue.claim_merge(run_id, socket.gethostname()):
+        logger.info("Merging shards of run_id:[{}]".format(run_id))
+        merge_shards(config, path, run_id, queue)
+    queue.close()
+    return summaries
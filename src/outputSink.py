@@ -0,0 +1,275 @@
+import datetime
+import json
+import logging
+import os
+import shutil
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+from recordBuffer import RecordBuffer
+from metrics import metrics
+from normalization import normalize
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+fh = logging.FileHandler('logs/outputSink.log')
+fh.setLevel(logging.INFO)
+formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
+fh.setFormatter(formatter)
+logger.addHandler(fh)
+
+
+def get_results_directory(path):
+    directory = path + "/results/" + datetime.datetime.today().strftime('%Y-%m-%d')
+    os.makedirs(directory, exist_ok=True)
+    return directory
+
+
+# Columns mixing several python types (e.g. "2" and 2) can not be typed, so they are saved as text.
+def to_typed_dataframe(records, columns):
+    df = pd.DataFrame(records, columns=columns)
+    for column in df.columns:
+        if df[column].dtype == object and pd.api.types.infer_dtype(df[column], skipna=True).startswith("mixed"):
+            df[column] = df[column].where(df[column].isnull(), df[column].astype(str))
+    return df
+
+
+# Keeps every record until close, because the csv header needs all the columns. With chunk_size the records are
+# spooled to a jsonl file instead, and written to the csv in chunks of chunk_size rows at close. Each chunk is
+# normalized (see normalization.py) before it is written.
+class CsvSink:
+    def __init__(self, directory, name, chunk_size=None, site=None):
+        self.filename = directory + "/{}.csv".format(name)
+        self.spool_filename = self.filename + ".jsonl"
+        self.chunk_size = chunk_size
+        self.site = site
+        self.houses = RecordBuffer()
+        if self.chunk_size and os.path.exists(self.spool_filename):
+            os.remove(self.spool_filename)
+
+    def write(self, records):
+        self.houses.extend(records)
+        if self.chunk_size and len(self.houses.records) >= self.chunk_size:
+            self.spool()
+
+    def spool(self):
+        with metrics.timer("persist_seconds", output="spool"):
+            with open(self.spool_filename, "a", encoding="UTF-8") as spool_file:
+                spool_file.write("".join(json.dumps(record, default=str) + "\n"
+                                         for record in self.houses.take_new("spool")))
+        self.houses.release()
+
+    def read_chunks(self):
+        chunk = []
+        with open(self.spool_filename, encoding="UTF-8") as spool_file:
+            for line in spool_file:
+                chunk.append(json.loads(line))
+                if len(chunk) >= self.chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def close(self):
+        if not self.chunk_size:
+            with metrics.timer("persist_seconds", output="csv"):
+                df = normalize(self.houses.to_dataframe(), self.site)
+                df.to_csv(self.filename, index=False, encoding="UTF-8")
+            logger.info("Saved {} rows in [{}]".format(len(self.houses), self.filename))
+            return
+        self.spool()
+        columns = list(self.houses.columns)
+        with metrics.timer("persist_seconds", output="csv"):
+            if len(self.houses) == 0:
+                pd.DataFrame().to_csv(self.filename, index=False, encoding="UTF-8")
+            for i, chunk in enumerate(self.read_chunks()):
+                df = normalize(pd.DataFrame(chunk, columns=columns), self.site)
+                df.to_csv(self.filename, mode="w" if i == 0 else "a", header=i == 0, index=False, encoding="UTF-8")
+        os.remove(self.spool_filename)
+        logger.info("Saved {} rows in chunks of {} in [{}]".format(len(self.houses), self.chunk_size, self.filename))
+
+
+# Writes a folder of parquet part files. Records are written in row groups of row_group_size rows; a new part file
+# is started when a row group brings columns, or types, that the current part does not have. Each row group is
+# normalized (see normalization.py) before it is written.
+class ParquetSink:
+    def __init__(self, directory, name, compression="snappy", row_group_size=10000, site=None):
+        self.directory = directory + "/" + name
+        self.site = site
+        self.compression = compression
+        self.row_group_size = row_group_size
+        self.houses = RecordBuffer()
+        self.writer = None
+        self.parts = 0
+        self.rows = 0
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+
+    def write(self, records):
+        self.houses.extend(records)
+        if len(self.houses) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if len(self.houses) == 0:
+            return
+        df = normalize(to_typed_dataframe(self.houses.records, list(self.houses.columns)), self.site)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is not None:
+            table = self.conform(table)
+        if table is None:
+            self.close_part()
+            table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.writer is None:
+            filename = self.directory + "/part-{:05d}.parquet".format(self.parts)
+            self.writer = pq.ParquetWriter(filename, table.schema, compression=self.compression)
+            self.parts += 1
+        with metrics.timer("persist_seconds", output="parquet"):
+            self.writer.write_table(table, row_group_size=self.row_group_size)
+        self.rows += table.num_rows
+        self.houses = RecordBuffer()
+
+    # Returns the table with the schema of the current part, or None if it does not fit in it.
+    def conform(self, table):
+        schema = self.writer.schema
+        if any(name not in schema.names for name in table.column_names):
+            return None
+        arrays = []
+        for field in schema:
+            if field.name not in table.column_names:
+                arrays.append(pa.nulls(table.num_rows, field.type))
+                continue
+            column = table.column(field.name)
+            if column.type == field.type:
+                arrays.append(column)
+            elif column.null_count == table.num_rows:
+                arrays.append(pa.nulls(table.num_rows, field.type))
+            else:
+                return None
+        return pa.Table.from_arrays(arrays, schema=schema)
+
+    def close_part(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def close(self):
+        self.flush()
+        self.close_part()
+        logger.info("Saved {} rows in {} parts in [{}]".format(self.rows, self.parts, self.directory))
+
+
+# Upserts the houses in the listing store, in batches of the store batch_size.
+class StoreSink:
+    def __init__(self, listing_store, site):
+        self.listing_store = listing_store
+        self.site = site
+        self.records = []
+        self.rows = 0
+
+    def write(self, records):
+        self.records.extend(records)
+        if len(self.records) >= self.listing_store.batch_size:
+            self.flush()
+
+    def flush(self):
+        if self.records:
+            with metrics.timer("persist_seconds", output="sqlite"):
+                self.rows += self.listing_store.upsert_many(self.site, self.records)
+            self.records = []
+
+    def close(self):
+        self.flush()
+        logger.info("Saved {} rows of [{}] in the listing store".format(self.rows, self.site))
+
+
+class OutputSinks:
+    def __init__(self, sinks):
+        self.sinks = sinks
+
+    def write(self, records):
+        for sink in self.sinks:
+            sink.write(records)
+
+    def close(self):
+        for sink in self.sinks:
+            sink.close()
+
+
+def is_streaming(config):
+    return config.get("streaming", "False").lower() == "true"
+
+
+# With streaming, no sink keeps more than chunk_size records in memory.
+def open_output_sink(config, path, name, listing_store=None, site=None):
+    directory = get_results_directory(path)
+    output_format = config.get("format", "csv").lower()
+    chunk_size = config.get("chunk_size", 1000) if is_streaming(config) else None
+    if output_format == "parquet" and pa is not None:
+        row_group_size = config.get("row_group_size", 10000)
+        sink = ParquetSink(directory, name, config.get("compression", "snappy"),
+                           min(row_group_size, chunk_size) if chunk_size else row_group_size, site)
+    else:
+        if output_format == "parquet":
+            logger.error("pyarrow is not installed, saving [{}] as csv".format(name))
+        sink = CsvSink(directory, name, chunk_size, site)
+    if listing_store is None:
+        return sink
+    return OutputSinks([sink, StoreSink(listing_store, site)])
+
+
+# The csv as text, so the values are written back unchanged (e.g. 3 does not become 3.0). A file without houses has
+# no header and gives an empty DataFrame.
+def read_csv_output(filename):
+    try:
+        return pd.read_csv(filename, dtype=str, keep_default_na=False)
+    except pd.errors.EmptyDataError:
+        return pd.DataFrame()
+
+
+# Joins the outputs saved with names, in that order, in one output called merged_name. The csv files are joined in
+# one csv; the parquet part files are moved, numbered in order, to one folder.
+def merge_outputs(path, names, merged_name):
+    directory = get_results_directory(path)
+    csv_filenames = [directory + "/{}.csv".format(name) for name in names
+                     if os.path.exists(directory + "/{}.csv".format(name))]
+    if csv_filenames:
+        frames = [frame for frame in (read_csv_output(filename) for filename in csv_filenames) if not frame.empty]
+        merged = pd.concat(frames, ignore_index=True, sort=False) if frames else pd.DataFrame()
+        merged.to_csv(directory + "/{}.csv".format(merged_name), index=False, encoding="UTF-8")
+        for filename in csv_filenames:
+            os.remove(filename)
+
+    parquet_directories = [directory + "/" + name for name in names if os.path.isdir(directory + "/" + name)]
+    if parquet_directories:
+        merged_directory = directory + "/" + merged_name
+        shutil.rmtree(merged_directory, ignore_errors=True)
+        os.makedirs(merged_directory, exist_ok=True)
+        part = 0
+        for parquet_directory in parquet_directories:
+            for filename in sorted(os.listdir(parquet_directory)):
+                os.rename(parquet_directory + "/" + filename, merged_directory + "/part-{:05d}.parquet".format(part))
+                part += 1
+            shutil.rmtree(parquet_directory)
+    logger.info("Merged {} outputs in [{}]".format(len(csv_filenames) + len(parquet_directories), merged_name))
+
+
+# Moves the outputs saved with names to the folder, inside the results folder, so they are not read as results.
+def quarantine_outputs(path, names, folder):
+    directory = get_results_directory(path)
+    filenames = [filename for name in names for filename in [name + ".csv", name]
+                 if os.path.exists(directory + "/" + filename)]
+    if not filenames:
+        return
+    os.makedirs(directory + "/" + folder, exist_ok=True)
+    for filename in filenames:
+        shutil.rmtree(directory + "/" + folder + "/" + filename, ignore_errors=True)
+        os.replace(directory + "/" + filename, directory + "/" + folder + "/" + filename)
+    logger.info("Moved {} outputs to [{}]".format(len(filenames), folder))
@@ -1,7 +1,18 @@
 import sys
 
+# When set, the progress is sent to this function instead of printed, e.g. to show it from another process.
+progress_sink = None
+
+
+def set_progress_sink(sink):
+    global progress_sink
+    progress_sink = sink
+
 
 def print_progress_bar(value, end_value, message="", start_value=0, bar_length=20):
+    if progress_sink is not None:
+        progress_sink(value, end_value, message, start_value)
+        return
     percent = (float(value) - float(start_value)) / (float(end_value) - float(start_value))
     arrow = '-' * int(round(percent * bar_length) - 1) + '>'
     spaces = ' ' * (bar_length - len(arrow))
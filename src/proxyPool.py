@@ -0,0 +1,170 @@
+import logging
+import random
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock, Thread
+from time import time
+
+import requests
+from lxml.html import fromstring
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+fh = logging.FileHandler('logs/proxyPool.log')
+fh.setLevel(logging.INFO)
+formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
+fh.setFormatter(formatter)
+logger.addHandler(fh)
+
+
+class FreeProxyListSource:
+    def __init__(self, url='https://free-proxy-list.net/'):
+        self.url = url
+
+    def get_candidates(self):
+        response = requests.get(self.url, timeout=10)
+        parser = fromstring(response.text)
+        proxies = []
+        for i in parser.xpath('//tbody/tr'):
+            if i.xpath('.//td[7][contains(text(),"yes")]'):
+                proxies.append(":".join([i.xpath('.//td[1]/text()')[0], i.xpath('.//td[2]/text()')[0]]))
+        return proxies
+
+
+class FileProxySource:
+    def __init__(self, filename):
+        self.filename = filename
+
+    def get_candidates(self):
+        with open(self.filename, encoding="UTF-8") as proxies_file:
+            return [line.strip() for line in proxies_file if line.strip() and not line.startswith("#")]
+
+
+class UrlProxySource:
+    def __init__(self, url):
+        self.url = url
+
+    def get_candidates(self):
+        response = requests.get(self.url, timeout=10)
+        return [line.strip() for line in response.text.splitlines() if line.strip()]
+
+
+def make_proxy_source(config):
+    source = config.get("source", "free-proxy-list")
+    if source == "file":
+        return FileProxySource(config["location"])
+    if source == "url":
+        return UrlProxySource(config["location"])
+    return FreeProxyListSource(config.get("location", 'https://free-proxy-list.net/'))
+
+
+class ProxyStats:
+    def __init__(self, latency):
+        self.successes = 1
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = latency
+
+    def add_success(self, latency):
+        self.successes += 1
+        self.consecutive_failures = 0
+        self.latency = 0.7 * self.latency + 0.3 * latency
+
+    def add_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+
+    def get_score(self):
+        success_rate = float(self.successes) / (self.successes + self.failures)
+        return success_rate / max(self.latency, 0.01)
+
+
+class ProxyPool:
+    def __init__(self, config):
+        self.source = make_proxy_source(config)
+        self.validation_url = config.get("validation_url", "https://httpbin.org/ip")
+        self.timeout = config.get("timeout", 10)
+        self.validation_workers = config.get("validation_workers", 10)
+        self.min_healthy = config.get("min_healthy", 5)
+        self.max_failures = config.get("max_failures", 3)
+        self.proxies = {}
+        self.discarded = set()
+        self.lock = Lock()
+        self.refill_lock = Lock()
+        self.refill_thread = None
+
+    def validate(self, proxy):
+        start = time()
+        try:
+            response = requests.get(self.validation_url, proxies={"http": proxy, "https": proxy},
+                                    timeout=self.timeout)
+            return proxy, response.ok, time() - start
+        except Exception:
+            return proxy, False, None
+
+    def refill(self):
+        with self.refill_lock:
+            logger.info("Start refill")
+            try:
+                candidates = self.source.get_candidates()
+            except Exception as e:
+                logger.error("Proxy candidates could not be obtained | Exception: {}".format(e))
+                return
+            with self.lock:
+                candidates = [proxy for proxy in set(candidates)
+                              if proxy not in self.proxies and proxy not in self.discarded]
+            if not candidates:
+                logger.info("End refill, no new candidates")
+                return
+            with ThreadPoolExecutor(max_workers=self.validation_workers) as executor:
+                results = list(executor.map(self.validate, candidates))
+            with self.lock:
+                for proxy, ok, latency in results:
+                    if ok:
+                        self.proxies[proxy] = ProxyStats(latency)
+                    else:
+                        self.discarded.add(proxy)
+            logger.info("End refill, healthy proxies:[{}] of [{}] candidates".format(
+                sum(1 for _, ok, _ in results if ok), len(candidates)))
+
+    def start_refill(self):
+        with self.lock:
+            if self.refill_thread is not None and self.refill_thread.is_alive():
+                return
+            self.refill_thread = Thread(target=self.refill, daemon=True)
+            self.refill_thread.start()
+
+    def acquire(self):
+        with self.lock:
+            proxies = list(self.proxies.items())
+        if not proxies:
+            self.refill()
+            with self.lock:
+                proxies = list(self.proxies.items())
+            if not proxies:
+                return None
+        return random.choices([proxy for proxy, _ in proxies],
+                              weights=[stats.get_score() for _, stats in proxies])[0]
+
+    def report(self, proxy, ok, latency=None):
+        with self.lock:
+            stats = self.proxies.get(proxy)
+            if stats is None:
+                return
+            if ok:
+                stats.add_success(latency)
+            else:
+                stats.add_failure()
+                if stats.consecutive_failures >= self.max_failures:
+                    logger.info("Discarding proxy:[{}]".format(proxy))
+                    del self.proxies[proxy]
+                    self.discarded.add(proxy)
+            healthy = len(self.proxies)
+        if healthy < self.min_healthy:
+            self.start_refill()
+
+    def get_stats(self):
+        with self.lock:
+            return {proxy: {"successes": stats.successes,
+                            "failures": stats.failures,
+                            "latency": round(stats.latency, 3),
+                            "score": round(stats.get_score(), 3)} for proxy, stats in self.proxies.items()}
@@ -0,0 +1,56 @@
+import random
+from threading import Lock
+from time import sleep, monotonic
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    def __init__(self, requests_per_second, burst=1, jitter=0.0):
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.jitter = jitter
+        self.tokens = burst
+        self.updated = monotonic()
+        self.lock = Lock()
+
+    def reserve(self):
+        if self.requests_per_second <= 0:
+            return 0
+        with self.lock:
+            now = monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.requests_per_second)
+            self.updated = now
+            self.tokens -= 1
+            wait_time = -self.tokens / self.requests_per_second if self.tokens < 0 else 0
+        if self.jitter:
+            wait_time += random.uniform(0, self.jitter)
+        return wait_time
+
+
+class RateLimiter:
+    def __init__(self, rate_limits, sleep_time):
+        self.rate_limits = dict(rate_limits)
+        if "default" not in self.rate_limits:
+            self.rate_limits["default"] = {
+                "requests_per_second": 1.0 / sleep_time if sleep_time else 0,
+                "burst": 1,
+                "jitter": 0
+            }
+        self.buckets = {}
+        self.lock = Lock()
+
+    def get_bucket(self, key):
+        with self.lock:
+            if key not in self.buckets:
+                limit = self.rate_limits.get(key, self.rate_limits["default"])
+                self.buckets[key] = TokenBucket(limit["requests_per_second"],
+                                                limit.get("burst", 1),
+                                                limit.get("jitter", 0))
+            return self.buckets[key]
+
+    def wait(self, url, budget=None):
+        key = budget if budget else urlparse(url).netloc
+        wait_time = self.get_bucket(key).reserve()
+        if wait_time > 0:
+            sleep(wait_time)
+        return wait_time
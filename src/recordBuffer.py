@@ -0,0 +1,44 @@
+import pandas as pd
+
+
+# The columns given are always in the DataFrame, even when no record was added.
+class RecordBuffer:
+    def __init__(self, columns=()):
+        self.records = []
+        self.columns = dict.fromkeys(columns)
+        self.cursors = {}
+        self.released = 0
+
+    def append(self, record):
+        self.records.append(record)
+        for key in record:
+            if key not in self.columns:
+                self.columns[key] = None
+
+    def update(self, record, values):
+        record.update(values)
+        for key in values:
+            if key not in self.columns:
+                self.columns[key] = None
+
+    def extend(self, records):
+        for record in records:
+            self.append(record)
+
+    def take_new(self, cursor):
+        start = max(self.cursors.get(cursor, 0) - self.released, 0)
+        self.cursors[cursor] = len(self)
+        return self.records[start:]
+
+    # Forgets the records already taken by every cursor, so a long run only keeps the ones not written yet.
+    # The length still counts the released records; to_dataframe only has the kept ones.
+    def release(self):
+        end = min(self.cursors.values(), default=self.released) - self.released
+        del self.records[:end]
+        self.released += end
+
+    def __len__(self):
+        return self.released + len(self.records)
+
+    def to_dataframe(self):
+        return pd.DataFrame(self.records, columns=list(self.columns))
@@ -1,8 +1,13 @@
-from time import sleep
-import requests
-from lxml.html import fromstring
+from time import time
+from urllib.parse import urlparse
 import logging
 
+from rateLimiter import RateLimiter
+from sessionPool import SessionPool
+from proxyPool import ProxyPool
+from responseCache import ResponseCache
+from metrics import metrics
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 fh = logging.FileHandler('logs/requestgetter.log')
@@ -14,96 +19,131 @@ logger.addHandler(fh)
 
 class RequestGetter:
     def __init__(self, config):
-        self.proxy_list = []
-        self.current_proxy = []
-        self.proxy_list = []
         self.use_proxy = config['use_proxy'].lower() == "true"
         self.max_attempts = config["max_attempts"]
         self.sleep_time = config["sleep_time"]
+        self.workers = config.get("workers", 1)
+        self.rate_limiter = RateLimiter(config.get("rate_limits", {}), self.sleep_time)
+        self.session_pool = SessionPool(config.get("session", {}), self.workers)
+        self.proxy_pool = ProxyPool(config.get("proxy", {})) if self.use_proxy else None
+        if self.proxy_pool:
+            self.proxy_pool.start_refill()
+        cache_config = config.get("cache", {})
+        self.cache = ResponseCache(cache_config) if cache_config.get("enabled", "False").lower() == "true" else None
         logger.info("Start with configuration: [{}]".format(config))
         print("----------------------")
         print("REQUEST CONFIGURATION:")
         print("use proxy: {}".format(self.use_proxy))
         print("max attempts: {}".format(self.max_attempts))
         print("sleep time: {}".format(self.sleep_time))
+        print("workers: {}".format(self.workers))
+        print("rate limits: {}".format(self.rate_limiter.rate_limits))
+        print("connection pool size: {}".format(self.session_pool.pool_maxsize))
+        print("cache: {}".format(self.cache.mode if self.cache else "disabled"))
         print("----------------------")
 
-    def get_proxies(self):
-        logger.info("Start get_proxies")
-        url = 'https://free-proxy-list.net/'
-        response = requests.get(url)
-        parser = fromstring(response.text)
-        proxies = []
-        for i in parser.xpath('//tbody/tr')[:10]:
-            if i.xpath('.//td[7][contains(text(),"yes")]'):
-                proxy = ":".join([i.xpath('.//td[1]/text()')[0], i.xpath('.//td[2]/text()')[0]])
-                proxies.append(proxy)
-        self.proxy_list = proxies
-        logger.info("End get_proxies :[{}]".format(proxies))
-
-    def get_proxy(self):
-        if len(self.proxy_list) == 0:
-            self.get_proxies()
-        return self.proxy_list.pop()
-
-    def update_current_proxy(self):
-        logger.info("Start update_current_proxy")
-        if not self.current_proxy:
-            self.current_proxy = self.get_proxy()
-        logger.info("End update_current_proxy:[{}]".format(self.current_proxy))
-
-    def delete_current_proxy(self):
-        logger.info("Start delete_current_proxy")
-        self.current_proxy = None
-        logger.info("End delete_current_proxy")
-
-    def get_without_proxy(self, url):
+    def get_without_proxy(self, url, headers=None):
         logger.info("Start get_without_proxy")
         response = None
         try:
-            response = requests.get(url)
-            sleep(self.sleep_time)
+            host = urlparse(url).netloc
+            with metrics.timer("rate_limit_wait_seconds", host=host):
+                self.rate_limiter.wait(url)
+            with metrics.timer("fetch_seconds", host=host, method="get"):
+                response = self.session_pool.get_session(url).get(url, headers=headers)
             logger.info("End get_without_proxy OK:[{}]".format(response))
         except Exception as e:
             logger.error("This url has not been processed: {} | Exception: {}".format(url, e))
 
         return response
 
-    def get_with_proxy(self, url):
+    def get_with_proxy(self, url, headers=None):
         logger.info("Start get_with_proxy url:[{}]".format(url))
         attempts = 0
         while attempts < self.max_attempts:
+            proxy = self.proxy_pool.acquire()
+            if proxy is None:
+                logger.info("get_with_proxy there are no healthy proxies")
+                break
+            start = time()
             try:
-                self.update_current_proxy()
-                response = requests.get(url, proxies={"http": self.current_proxy, "https": self.current_proxy},
-                                        timeout=10)
-                logger.info(
-                    "End get_with_proxy proxy:[{}], response[{}],url:[{}]".format(self.current_proxy, response, url))
+                session = self.session_pool.get_session(url, proxied=True)
+                with metrics.timer("fetch_seconds", host=urlparse(url).netloc, method="get"):
+                    response = session.get(url,
+                                           headers=headers,
+                                           proxies={"http": proxy, "https": proxy},
+                                           timeout=self.proxy_pool.timeout)
+                self.proxy_pool.report(proxy, True, time() - start)
+                logger.info("End get_with_proxy proxy:[{}], response[{}],url:[{}]".format(proxy, response, url))
                 return response
             except Exception as e:
                 attempts += 1
-                self.delete_current_proxy()
-                logger.info(
-                    "Error get_with_proxy number:[{}], proxy:[{}],url:[{}]".format(attempts, self.current_proxy, url))
+                self.proxy_pool.report(proxy, False)
+                logger.info("Error get_with_proxy number:[{}], proxy:[{}],url:[{}]".format(attempts, proxy, url))
         logger.info("get_with_proxy max attempts reached, trying without proxy")
-        return self.get_without_proxy(url)
+        return self.get_without_proxy(url, headers)
+
+    def fetch(self, url, skip_proxy=False, headers=None):
+        host = urlparse(url).netloc
+        response = self.get_with_proxy(url, headers) if self.use_proxy and not skip_proxy else \
+            self.get_without_proxy(url, headers)
+        metrics.inc("responses_total", host=host, method="get",
+                    status=response.status_code if response is not None else "error")
+        if response is not None:
+            metrics.inc("response_bytes_total", len(response.content), host=host)
+        return response
 
     def get(self, url, skip_proxy=False):
-        return self.get_with_proxy(url) if self.use_proxy and not skip_proxy else self.get_without_proxy(url)
+        if self.cache is None:
+            return self.fetch(url, skip_proxy)
 
-    def post(self, url, data, headers=None):
-        return self.post_with_proxy(url, data, headers) if self.use_proxy else self.post_without_proxy(url, data,
-                                                                                                       headers)
+        entry = self.cache.lookup(url)
+        if entry is not None and (self.cache.mode == "replay" or self.cache.is_fresh(entry)):
+            response = self.cache.hit(entry)
+            if response is not None:
+                logger.info("Cache hit url:[{}]".format(url))
+                metrics.inc("cache_total", host=urlparse(url).netloc, result="hit")
+                return response
+            # The body of the entry is missing and the entry was dropped: the url is downloaded again.
+            entry = None
+        if self.cache.mode == "replay":
+            logger.info("Cache miss in replay mode url:[{}]".format(url))
+            return None
 
-    def post_without_proxy(self, url, data, headers=None):
+        metrics.inc("cache_total", host=urlparse(url).netloc, result="miss" if entry is None else "stale")
+        headers = self.cache.get_conditional_headers(entry) if entry is not None else None
+        response = self.fetch(url, skip_proxy, headers)
+        if response is not None and response.status_code == 304 and entry is not None:
+            cached = self.cache.revalidate(entry)
+            if cached is not None:
+                logger.info("Cache revalidated url:[{}]".format(url))
+                metrics.inc("cache_total", host=urlparse(url).netloc, result="revalidated")
+                return cached
+            response = self.fetch(url, skip_proxy)
+        if response is not None and response.ok:
+            self.cache.store(url, response)
+        return response
+
+    def post(self, url, data, headers=None, budget=None):
+        host = urlparse(url).netloc
+        response = self.post_with_proxy(url, data, headers, budget) if self.use_proxy else \
+            self.post_without_proxy(url, data, headers, budget)
+        metrics.inc("responses_total", host=host, method="post",
+                    status=response.status_code if response is not None else "error")
+        return response
+
+    def post_without_proxy(self, url, data, headers=None, budget=None):
         logger.info("Start post_without_proxy")
         response = None
         try:
-            response = requests.post(url,
-                                     data=data,
-                                     headers=headers,
-                                     timeout=10)
-            sleep(self.sleep_time)
+            host = urlparse(url).netloc
+            with metrics.timer("rate_limit_wait_seconds", host=host):
+                self.rate_limiter.wait(url, budget)
+            with metrics.timer("fetch_seconds", host=host, method="post"):
+                response = self.session_pool.get_session(url).post(url,
+                                                                   data=data,
+                                                                   headers=headers,
+                                                                   timeout=10)
             logger.info(
                 "End post_without_proxy, response[{response}], url:[{url}],"
                 "data:[{data}], headers:[{headers}]".format(response=response,
@@ -115,31 +155,50 @@ class RequestGetter:
 
         return response
 
-    def post_with_proxy(self, url, data, headers=None):
+    def post_with_proxy(self, url, data, headers=None, budget=None):
         logger.info("Start post_with_proxy url:[{}]".format(url))
         attempts = 0
         while attempts < self.max_attempts:
+            proxy = self.proxy_pool.acquire()
+            if proxy is None:
+                logger.info("post_with_proxy there are no healthy proxies")
+                break
+            start = time()
             try:
-                self.update_current_proxy()
-                response = requests.post(url,
-                                         data=data,
-                                         headers=headers,
-                                         proxies={"http": self.current_proxy, "https": self.current_proxy},
-                                         timeout=10)
+                session = self.session_pool.get_session(url, proxied=True)
+                with metrics.timer("fetch_seconds", host=urlparse(url).netloc, method="post"):
+                    response = session.post(url,
+                                            data=data,
+                                            headers=headers,
+                                            proxies={"http": proxy, "https": proxy},
+                                            timeout=self.proxy_pool.timeout)
                 logger.info(
-                    "End post_with_proxy proxy:[{proxy}], response[{response}], url:[{url}]," 
-                    "data:[{data}], headers:[{headers}]".format(proxy=self.current_proxy,
+                    "End post_with_proxy proxy:[{proxy}], response[{response}], url:[{url}],"
+                    "data:[{data}], headers:[{headers}]".format(proxy=proxy,
                                                                 response=response,
                                                                 url=url,
                                                                 data=data,
                                                                 headers=headers))
                 if not response.ok:
                     raise Exception("Not 200 Exception")
+                self.proxy_pool.report(proxy, True, time() - start)
                 return response
             except Exception as e:
                 attempts += 1
-                logger.info(
-                    "Error post_with_proxy number:[{}], proxy:[{}],url:[{}]".format(attempts, self.current_proxy, url))
-                self.delete_current_proxy()
+                self.proxy_pool.report(proxy, False)
+                logger.info("Error post_with_proxy number:[{}], proxy:[{}],url:[{}]".format(attempts, proxy, url))
         logger.info("post_with_proxy max attempts reached, trying without proxy")
-        return self.post_without_proxy(url, data, headers)
+        return self.post_without_proxy(url, data, headers, budget)
+
+    def get_pool_stats(self):
+        return self.session_pool.get_stats()
+
+    def close(self):
+        logger.info("Connection pool stats: [{}]".format(self.get_pool_stats()))
+        if self.proxy_pool:
+            logger.info("Proxy pool stats: [{}]".format(self.proxy_pool.get_stats()))
+        if self.cache:
+            logger.info("Cache stats: [{}]".format(self.cache.get_stats()))
+            print("Cache stats: {}".format(self.cache.get_stats()))
+            self.cache.close()
+        self.session_pool.close()
@@ -0,0 +1,175 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from threading import Lock
+from time import time
+
+from requests.models import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+fh = logging.FileHandler('logs/responseCache.log')
+fh.setLevel(logging.INFO)
+formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
+fh.setFormatter(formatter)
+logger.addHandler(fh)
+
+KEPT_HEADERS = ["Content-Type", "ETag", "Last-Modified"]
+
+
+class ResponseCache:
+    def __init__(self, config):
+        self.mode = config.get("mode", "revalidate")
+        self.directory = config.get("directory", "cache")
+        self.ttl = config.get("ttl_hours", 24) * 3600
+        self.max_size = config.get("max_size_mb", 1024) * 1024 * 1024
+        self.bodies_directory = self.directory + "/bodies"
+        os.makedirs(self.bodies_directory, exist_ok=True)
+        self.lock = Lock()
+        self.connection = sqlite3.connect(self.directory + "/index.sqlite", timeout=30, check_same_thread=False)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                body_hash TEXT NOT NULL,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+            CREATE TABLE IF NOT EXISTS bodies (
+                body_hash TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+        """)
+        self.size = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM bodies").fetchone()[0]
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+    def get_body_filename(self, body_hash):
+        return "{}/{}.gz".format(self.bodies_directory, body_hash)
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT body_hash, status, headers, stored_at FROM entries WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return {"url": url, "body_hash": row[0], "status": row[1], "headers": json.loads(row[2]),
+                "stored_at": row[3]}
+
+    def is_fresh(self, entry):
+        return time() - entry["stored_at"] < self.ttl
+
+    def get_conditional_headers(self, entry):
+        headers = {}
+        if "ETag" in entry["headers"]:
+            headers["If-None-Match"] = entry["headers"]["ETag"]
+        if "Last-Modified" in entry["headers"]:
+            headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+        return headers
+
+    def load_response(self, entry):
+        try:
+            with gzip.open(self.get_body_filename(entry["body_hash"]), "rb") as body_file:
+                body = body_file.read()
+        except (IOError, OSError) as e:
+            logger.error("Cached body could not be read url:[{}] | Exception: {}".format(entry["url"], e))
+            self.forget(entry)
+            return None
+        with self.lock:
+            self.connection.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (time(), entry["url"]))
+            self.connection.commit()
+        response = Response()
+        response._content = body
+        response.status_code = entry["status"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = entry["url"]
+        response.from_cache = True
+        return response
+
+    def hit(self, entry):
+        response = self.load_response(entry)
+        if response is not None:
+            self.hits += 1
+        return response
+
+    def revalidate(self, entry):
+        with self.lock:
+            self.connection.execute("UPDATE entries SET stored_at = ? WHERE url = ?", (time(), entry["url"]))
+            self.connection.commit()
+        response = self.load_response(entry)
+        if response is not None:
+            self.revalidated += 1
+        return response
+
+    # Drops the entry of a url whose body can not be read, so the url is downloaded and stored again.
+    def forget(self, entry):
+        with self.lock:
+            self.connection.execute("DELETE FROM entries WHERE url = ? AND body_hash = ?",
+                                    (entry["url"], entry["body_hash"]))
+            self.delete_body_if_unused(entry["body_hash"])
+            self.connection.commit()
+
+    def store(self, url, response):
+        self.misses += 1
+        body = response.content
+        body_hash = hashlib.sha256(body).hexdigest()
+        body_filename = self.get_body_filename(body_hash)
+        if not os.path.exists(body_filename):
+            temp_filename = "{}.{}.tmp".format(body_filename, os.getpid())
+            with gzip.open(temp_filename, "wb") as body_file:
+                body_file.write(body)
+            os.replace(temp_filename, body_filename)
+        headers = {header: response.headers[header] for header in KEPT_HEADERS if header in response.headers}
+        now = time()
+        with self.lock:
+            previous = self.connection.execute("SELECT body_hash FROM entries WHERE url = ?", (url,)).fetchone()
+            if self.connection.execute("INSERT OR IGNORE INTO bodies (body_hash, size) VALUES (?, ?)",
+                                       (body_hash, os.path.getsize(body_filename))).rowcount:
+                self.size += os.path.getsize(body_filename)
+            self.connection.execute("INSERT OR REPLACE INTO entries (url, body_hash, status, headers, stored_at, "
+                                    "accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                                    (url, body_hash, response.status_code, json.dumps(headers), now, now))
+            if previous is not None and previous[0] != body_hash:
+                self.delete_body_if_unused(previous[0])
+            self.connection.commit()
+        if self.size > self.max_size:
+            self.evict()
+
+    def delete_body_if_unused(self, body_hash):
+        if self.connection.execute("SELECT 1 FROM entries WHERE body_hash = ? LIMIT 1", (body_hash,)).fetchone():
+            return
+        row = self.connection.execute("SELECT size FROM bodies WHERE body_hash = ?", (body_hash,)).fetchone()
+        if row is None:
+            return
+        self.connection.execute("DELETE FROM bodies WHERE body_hash = ?", (body_hash,))
+        self.size -= row[0]
+        if os.path.exists(self.get_body_filename(body_hash)):
+            os.remove(self.get_body_filename(body_hash))
+
+    def evict(self):
+        with self.lock:
+            logger.info("Start evict size:[{}]".format(self.size))
+            oldest = self.connection.execute("SELECT url, body_hash FROM entries ORDER BY accessed_at").fetchall()
+            for url, body_hash in oldest:
+                if self.size <= self.max_size * 0.9:
+                    break
+                self.connection.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self.delete_body_if_unused(body_hash)
+            self.connection.commit()
+            logger.info("End evict size:[{}]".format(self.size))
+
+    def get_stats(self):
+        return {"hits": self.hits, "revalidated": self.revalidated, "misses": self.misses}
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
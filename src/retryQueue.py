@@ -0,0 +1,140 @@
+import json
+import logging
+import sqlite3
+from threading import Lock
+from time import time, sleep
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+fh = logging.FileHandler('logs/retryQueue.log')
+fh.setLevel(logging.INFO)
+formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
+fh.setFormatter(formatter)
+logger.addHandler(fh)
+
+
+# Items (pages, urls, ids) that failed are saved in a SQLite file and tried again later, waiting twice as long after
+# each failure. After max_attempts failures, or after a terminal failure that will not change by trying again (e.g. a
+# page that does not exist), they are moved to the dead_letters table, so they can be checked later.
+class RetryQueue:
+    def __init__(self, path, config):
+        self.max_attempts = config.get("max_attempts", 5)
+        self.base_delay = config.get("base_delay", 30)
+        self.max_delay = config.get("max_delay", 900)
+        self.lock = Lock()
+        self.connection = sqlite3.connect(path + "/" + config.get("filename", "temp/retries.sqlite"), timeout=30,
+                                          check_same_thread=False)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS retries (
+                name TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                next_attempt REAL,
+                last_error TEXT,
+                PRIMARY KEY (name, item_key)
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letters (
+                name TEXT NOT NULL,
+                item_key TEXT NOT NULL,
+                attempts INTEGER NOT NULL,
+                last_error TEXT,
+                failed_at REAL NOT NULL
+            )
+        """)
+        self.connection.commit()
+
+    # Without resume the retries of the last execution are forgotten. With resume, the items that were being tried
+    # when it stopped are tried again.
+    def start(self, name, resume):
+        with self.lock:
+            if resume:
+                self.connection.execute("UPDATE retries SET next_attempt = ? WHERE name = ? AND next_attempt IS NULL",
+                                        (time(), name))
+            else:
+                self.connection.execute("DELETE FROM retries WHERE name = ?", (name,))
+            self.connection.commit()
+
+    # Numbers read by pandas (e.g. numpy.int64) are not json, so they are saved as text.
+    def get_key(self, item):
+        return json.dumps(item, default=str)
+
+    def get_delay(self, attempts):
+        return min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+
+    def fail(self, name, item, error, terminal=False):
+        item_key = self.get_key(item)
+        with self.lock:
+            row = self.connection.execute("SELECT attempts FROM retries WHERE name = ? AND item_key = ?",
+                                          (name, item_key)).fetchone()
+            attempts = (row[0] if row else 0) + 1
+            if terminal or attempts >= self.max_attempts:
+                logger.error("Giving up [{}] item:[{}] attempts:[{}] error:[{}]".format(name, item, attempts, error))
+                self.connection.execute("DELETE FROM retries WHERE name = ? AND item_key = ?", (name, item_key))
+                self.connection.execute("""
+                    INSERT INTO dead_letters (name, item_key, attempts, last_error, failed_at) VALUES (?, ?, ?, ?, ?)
+                """, (name, item_key, attempts, error, time()))
+            else:
+                delay = self.get_delay(attempts)
+                logger.info("Retry [{}] item:[{}] in {}s attempts:[{}] error:[{}]".format(name, item, delay, attempts,
+                                                                                        error))
+                self.connection.execute("""
+                    INSERT OR REPLACE INTO retries (name, item_key, attempts, next_attempt, last_error)
+                    VALUES (?, ?, ?, ?, ?)
+                """, (name, item_key, attempts, time() + delay, error))
+            self.connection.commit()
+
+    def succeed(self, name, item):
+        with self.lock:
+            self.connection.execute("DELETE FROM retries WHERE name = ? AND item_key = ?", (name, self.get_key(item)))
+            self.connection.commit()
+
+    def is_queued(self, name, item):
+        with self.lock:
+            return self.connection.execute("SELECT 1 FROM retries WHERE name = ? AND item_key = ?",
+                                           (name, self.get_key(item))).fetchone() is not None
+
+    # The due items are marked as being tried (next_attempt NULL) until fail or succeed is called for them.
+    def take_due(self, name):
+        with self.lock:
+            rows = self.connection.execute("""
+                SELECT item_key FROM retries WHERE name = ? AND next_attempt <= ? ORDER BY next_attempt
+            """, (name, time())).fetchall()
+            self.connection.executemany("UPDATE retries SET next_attempt = NULL WHERE name = ? AND item_key = ?",
+                                        [(name, row[0]) for row in rows])
+            self.connection.commit()
+        return [json.loads(row[0]) for row in rows]
+
+    def get_next_wait(self, name):
+        with self.lock:
+            row = self.connection.execute("SELECT MIN(next_attempt) FROM retries WHERE name = ?", (name,)).fetchone()
+        return max(row[0] - time(), 0) if row[0] is not None else None
+
+    def has_scheduled(self, name):
+        return self.get_next_wait(name) is not None
+
+    # Yields the items and, between them, the failed ones whose retry time arrived. When the items are over, it
+    # waits for the failed ones that are still scheduled. The items already queued from a resumed execution are
+    # tried when their retry time arrives.
+    def iter_items(self, name, items):
+        for item in items:
+            if not self.is_queued(name, item):
+                yield item
+            for retry_item in self.take_due(name):
+                yield retry_item
+        wait = self.get_next_wait(name)
+        while wait is not None:
+            sleep(wait)
+            for retry_item in self.take_due(name):
+                yield retry_item
+            wait = self.get_next_wait(name)
+
+    def count_dead_letters(self, name, since=0):
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM dead_letters WHERE name = ? AND failed_at >= ?",
+                                           (name, since)).fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
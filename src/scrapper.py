@@ -5,10 +5,10 @@ import os
 import json
 import logging
 
-from meliScrapper import MeliScrapper
-from requestgetter import RequestGetter
-from lavozScrapper import LaVozScrapper
-from zonapropScrapper import ZonapropScrapper
+from orchestrator import SITES, run_sequential, run_processes, run_partitioned
+from outputSink import get_results_directory
+from dedup import find_duplicates
+from metrics import metrics
 from random import randint
 
 path = os.path.dirname(os.path.realpath('__file__'))
@@ -23,41 +23,64 @@ formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
 fh.setFormatter(formatter)
 logger.addHandler(fh)
 
-logger.info("-----Start Proppi Scrapper----")
-print("-----Start Proppi Scrapper----")
 
-scrap_lavoz = config['scrap_lavoz'].lower() == "true"
-scrap_meli = config['scrap_meli'].lower() == "true"
-scrap_zonaprop = config['scrap_zonaprop'].lower() == "true"
+def print_summary(summaries):
+    print("----------------------")
+    print("RUN SUMMARY:")
+    for summary in summaries:
+        print("{job}: {status} in {seconds}s {error}".format(job=summary["job"],
+                                                             status=summary["status"],
+                                                             seconds=summary.get("seconds", "-"),
+                                                             error=summary.get("error", "")))
+    print("----------------------")
+    with open(get_results_directory(path) + "/run_summary.json", "w") as summary_file:
+        json.dump(summaries, summary_file, indent=2, default=str)
 
-config["zonaprop"]["sleep"] = config['requests']['use_proxy'] == "False"
 
-request_getter = RequestGetter(config['requests'])
+def main():
+    logger.info("-----Start Proppi Scrapper----")
+    print("-----Start Proppi Scrapper----")
 
-if scrap_lavoz:
-    lavoz_scrapper = LaVozScrapper(config["lavoz"], request_getter, path)
-    lavoz_scrapper.scrap_ids()
-    lavoz_scrapper.get_houses_info()
+    resume = config['resume'].lower() == "true"
+    pipeline = config['pipeline'].lower() == "true"
+    processes = config.get('processes', 1)
+    shard = config.get('shard', "False").lower() == "true"
+    partition = config['partition']['enabled'].lower() == "true"
+    sites = [site for site in SITES if config['scrap_' + site].lower() == "true"]
 
-if scrap_meli:
-    meli_scrapper = MeliScrapper(config["meli"], request_getter, path)
-    meli_scrapper.scrap_ids()
-    meli_scrapper.houses_id_info()
+    for site in SITES:
+        config[site]["resume"] = resume
+        config[site]["html_parser"] = config["html_parser"]
+        config[site]["output"] = config["output"]
+        config[site]["retries"] = config["retries"]
 
-if scrap_zonaprop:
-    zonaprop_scrapper = ZonapropScrapper(config["zonaprop"], request_getter, path)
-    zonaprop_scrapper.scrap()
+    metrics.start_reporter(config['metrics']['report_interval'])
+    metrics.start_prometheus(config['metrics']['prometheus_port'])
+    if partition:
+        summaries = run_partitioned(config, path, sites, pipeline, processes)
+    elif processes > 1:
+        summaries = run_processes(config, path, sites, pipeline, processes, shard)
+    else:
+        summaries = run_sequential(config, path, sites, pipeline)
+    logger.info("Run summary: [{}]".format(summaries))
+    print_summary(summaries)
+    if config['dedup']['enabled'].lower() == "true":
+        find_duplicates(config, path, SITES)
+    metrics.save_report(get_results_directory(path) + "/metrics_report.json")
 
-phrases = ["The best way to predict the future is to create it.",
-           "Live as if you were to die tomorrow.Learn as if you were to live forever.",
-           "Do the difficult things while they are easy and do the great things while they are small. A journey of a thousand miles begins with a single step.",
-           "Today a reader, tomorrow a leader,",
-           "If you can dream it, you can do it.",
-           "Ever tried. Ever failed. No matter. Try again. Fail again. Fail better.",
-           "Tell me and I forget. Teach me and I remember. Involve me and I learn"]
+    phrases = ["The best way to predict the future is to create it.",
+               "Live as if you were to die tomorrow.Learn as if you were to live forever.",
+               "Do the difficult things while they are easy and do the great things while they are small. A journey of a thousand miles begins with a single step.",
+               "Today a reader, tomorrow a leader,",
+               "If you can dream it, you can do it.",
+               "Ever tried. Ever failed. No matter. Try again. Fail again. Fail better.",
+               "Tell me and I forget. Teach me and I remember. Involve me and I learn"]
 
-logger.info("-----End Proppi Scrapper----")
-print("-----End Proppi Scrapper Succsesfully----")
-print("I hope you have a really nice day, and remember:")
-print(phrases[randint(0, len(phrases) - 1)])
+    logger.info("-----End Proppi Scrapper----")
+    print("-----End Proppi Scrapper Succsesfully----")
+    print("I hope you have a really nice day, and remember:")
+    print(phrases[randint(0, len(phrases) - 1)])
 
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import os
+import logging
+from time import time
+
+import pandas as pd
+
+from progressBarPrinter import print_progress_bar
+from htmlParser import parse_html
+from fetchPool import fetch_all, run_pipeline, unique
+from recordBuffer import RecordBuffer
+from checkpointStore import CheckpointStore
+from outputSink import open_output_sink, is_streaming
+from retryQueue import RetryQueue
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+fh = logging.FileHandler('logs/scrapperEngine.log')
+fh.setLevel(logging.INFO)
+formatter = logging.Formatter('[%(asctime)s][%(levelname)s] %(message)s')
+fh.setFormatter(formatter)
+logger.addHandler(fh)
+
+# Answers of pages that do not exist, so they are not downloaded again.
+GONE_STATUSES = (404, 410)
+
+
+# A scope is one search of a site: [publisher_type], [publisher_type, operation_type] in Mercado Libre or [province]
+# in OLX.
+def get_scopes(site_config):
+    if "provinces" in site_config:
+        return [[province] for province in site_config["provinces"]]
+    scopes = [[publisher_type] for publisher_type in site_config["publisher_types"]]
+    if "operation_types" in site_config:
+        scopes = [scope + [operation_type] for scope in scopes for operation_type in site_config["operation_types"]]
+    return scopes
+
+
+# The configuration of the site that only searches the given scope.
+def get_scope_config(site_config, scope):
+    scope_config = dict(site_config)
+    if "provinces" in site_config:
+        scope_config["provinces"] = scope[:1]
+        return scope_config
+    scope_config["publisher_types"] = scope[:1]
+    if "operation_types" in site_config:
+        scope_config["operation_types"] = scope[1:]
+    return scope_config
+
+
+# The text of each search result link, by its url.
+def get_cards(response_soup, link_class):
+    return {house_item.get("href"): house_item.get_text(" ", strip=True)
+            for house_item in response_soup.find_all("a", {"class": link_class})}
+
+
+# Scraps a site in two stages: the search pages give the keys (urls or ids) of the houses, saved in the ids files,
+# and then each house is downloaded. The engine does the scheduling, concurrency, checkpoints, retries and output;
+# each site is a subclass that builds its search urls and extracts the keys and the houses.
+class ScrapperEngine:
+    # Name of the site (metrics, listing index and store, ids folder) and name shown in the messages.
+    site = None
+    title = None
+    # Column of the ids files with the key passed to get_house_info.
+    key = "url"
+    # Elements of the search pages that are parsed.
+    search_elements = None
+
+    def __init__(self, config, request_getter, path, listing_index=None, listing_store=None):
+        self.from_page = config["from_page"]
+        self.pages = config["pages"]
+        self.scopes = get_scopes(config)
+        self.ids_filename = config["ids_filename"]
+        self.result_filename = config["result_filename"]
+        self.resume = config.get("resume", False)
+        self.html_parser = config.get("html_parser", "lxml")
+        self.output = config.get("output", {})
+        self.streaming = is_streaming(self.output)
+        self.request_getter = request_getter
+        self.listing_index = listing_index
+        self.listing_store = listing_store
+        self.path = path
+        self.retries = RetryQueue(self.path, config.get("retries", {}))
+        self.ids_directory = self.path + "/ids_to_search/" + self.site
+        logger.info("Start {} with configuration: [{}]".format(self.site, config))
+        print("----------------------")
+        print("{} SCRAPPER CONFIGURATION:".format(self.title.upper()))
+        print("page from: {}".format(self.from_page))
+        print("pages: {}".format(self.pages))
+        print("searches: {}".format(["-".join(scope) for scope in self.scopes]))
+        print("id filename prefix: {}".format(self.ids_filename))
+        print("result filename prefix: {}".format(self.result_filename))
+        print("resume: {}".format(self.resume))
+        print("html parser: {}".format(self.html_parser))
+        print("output format: {}".format(self.output.get("format", "csv")))
+        print("streaming: {}".format(self.streaming))
+        for name, value in self.get_site_configuration():
+            print("{}: {}".format(name, value))
+        print("----------------------")
+
+    # (name, value) pairs of the site own configuration, shown with the rest.
+    def get_site_configuration(self):
+        return []
+
+    def get_search_url(self, scope, page):
+        raise NotImplementedError
+
+    # Returns a (key, listing_id, fingerprint) tuple for each house of a parsed search page.
+    def extract_search(self, response_soup):
+        raise NotImplementedError
+
+    # Returns the info of the house, or {} if it could not be downloaded.
+    def get_house_info(self, key):
+        raise NotImplementedError
+
+    # Returns None if the page could not be downloaded or the site answered with an error (e.g. 403 or 429).
+    def get(self, url, parse_only=None):
+        response = self.request_getter.get(url)
+        if response is None:
+            return response
+        return self.parse(response, url, parse_only)
+
+    def parse(self, response, url, parse_only=None):
+        if not response.ok:
+            logger.info("Error response: site[{}] status[{}] url[{}]".format(self.site, response.status_code, url))
+            return None
+        with metrics.timer("parse_seconds", site=self.site):
+            return parse_html(response.content, self.html_parser, parse_only)
+
+    # Returns the response and the houses of the page, or None as houses if the page could not be downloaded.
+    def get_search_houses(self, search_url):
+        response = self.request_getter.get(search_url)
+        response_soup = self.parse(response, search_url, self.search_elements) if response is not None else None
+        if response_soup is None:
+            return response, None
+        page_houses = self.extract_search(response_soup)
+        response_soup.decompose()
+        return response, page_houses
+
+    # The columns of the ids files, also written when every house of the scope is unchanged.
+    def get_ids_columns(self):
+        return [self.key, "processed", "listing_id", "fingerprint"]
+
+    def get_ids_filename(self, scope):
+        return "{}/{}_{}_ids.csv".format(self.ids_directory, self.ids_filename, "_".join(scope))
+
+    def iter_ids(self, scope, houses_keys, show_progress=True):
+        ids_name = "_".join(scope + [self.ids_filename])
+        label = "-".join(scope)
+        checkpoint = CheckpointStore(self.path, ids_name)
+        records, processed_pages = checkpoint.start(self.resume)
+        self.retries.start(ids_name, self.resume)
+        start = time()
+        houses_keys.extend(records)
+        houses_keys.take_new("checkpoint")
+        for record in records:
+            yield record[self.key]
+
+        last_page = self.from_page + self.pages - 1
+        if show_progress:
+            print_progress_bar(self.from_page - 1, last_page, label + " ids", self.from_page - 1)
+        pages = range(self.from_page, last_page + 1)
+        for page in self.retries.iter_items(ids_name, (page for page in pages if page not in processed_pages)):
+            search_url = self.get_search_url(scope, page)
+            response, page_houses = self.get_search_houses(search_url)
+            if page_houses is None:
+                status = response.status_code if response is not None else None
+                logger.info("Error trying to get this page: site[{}] number[{}] search[{}] url[{}] status[{}]".format(
+                    self.site, page, label, search_url, status))
+                self.retries.fail(ids_name, page, "page not downloaded", terminal=status in GONE_STATUSES)
+                continue
+            # A page without houses is after the last page of results, trying it again gives the same page
+            if not page_houses:
+                logger.info("Error trying to get the houses list: site[{}] number[{}] search[{}] url[{}]".format(
+                    self.site, page, label, search_url))
+                self.retries.fail(ids_name, page, "no houses in page", terminal=True)
+                continue
+
+            page_houses = [{self.key: key, "processed": False, "listing_id": listing_id, "fingerprint": fingerprint}
+                           for key, listing_id, fingerprint in page_houses]
+            if self.listing_index is not None:
+                page_houses = self.listing_index.filter_changed(self.site, page_houses)
+            houses_keys.extend(page_houses)
+            checkpoint.mark_processed(page)
+            checkpoint.save(houses_keys.take_new("checkpoint"))
+            self.retries.succeed(ids_name, page)
+            if show_progress:
+                print_progress_bar(page, last_page, label + " ids", self.from_page - 1)
+            for house in page_houses:
+                yield house[self.key]
+        self.report_dead_letters(ids_name, start)
+
+    def save_ids(self, scope, houses_keys_df):
+        os.makedirs(self.ids_directory, exist_ok=True)
+
+        houses_keys_df.to_csv(self.get_ids_filename(scope), index=False, encoding="UTF-8")
+
+    def scrap_ids(self):
+        logger.info("Start scrap_ids {}".format(self.site))
+        print("Start {} ID Scrapping".format(self.title))
+        for scope in self.scopes:
+            label = "-".join(scope)
+            logger.info("Start scrap_ids {} {}".format(self.site, label))
+            print("Start {} id scrapping".format(label))
+            houses_keys = RecordBuffer(self.get_ids_columns())
+            for _ in self.iter_ids(scope, houses_keys):
+                pass
+            self.save_ids(scope, houses_keys.to_dataframe())
+            logger.info("End scrap_ids {} {}".format(self.site, label))
+            print("")
+            print("End {} id scrapping".format(label))
+        logger.info("End scrap_ids {}".format(self.site))
+        print("End {} ID Scrapping".format(self.title))
+
+    # The keys read from the ids files and from the checkpoints are compared as text.
+    def scrap_houses(self, scope, houses_keys, fetch, count_rows):
+        houses = RecordBuffer()
+        houses_name = "_".join([self.result_filename] + scope)
+        label = "-".join(scope)
+        checkpoint = CheckpointStore(self.path, houses_name)
+        sink = open_output_sink(self.output, self.path, houses_name, self.listing_store, self.site)
+        records, processed_keys = checkpoint.start(self.resume)
+        self.retries.start(houses_name, self.resume)
+        start = time()
+        houses.extend(records)
+        houses.take_new("checkpoint")
+        i = len(processed_keys)
+        if self.resume:
+            logger.info("Resuming {} {} with {} houses already processed".format(self.site, label, i))
+        pending_keys = (key for key in houses_keys if str(key) not in processed_keys)
+        print_progress_bar(i, max(count_rows(), i, 1), label + " " + str(i))
+        while pending_keys is not None:
+            for key, house_info in fetch(self.get_house_info, self.retries.iter_items(houses_name, pending_keys),
+                                         self.request_getter.workers):
+                i += 1
+                if house_info == {}:
+                    logger.info("This house could not be processed: {}".format(key))
+                    self.retries.fail(houses_name, key, "house not downloaded")
+                    continue
+                self.retries.succeed(houses_name, key)
+                houses.append(house_info)
+                processed_keys.add(str(key))
+                checkpoint.mark_processed(str(key))
+                if i % 5 == 0:
+                    checkpoint.save(houses.take_new("checkpoint"))
+                    sink.write(houses.take_new("output"))
+                    if self.streaming:
+                        houses.release()
+                print_progress_bar(i, max(count_rows(), i, 1), label + " " + str(i))
+            # Houses that failed while the last ones were being downloaded are still waiting for their retry
+            pending_keys = [] if self.retries.has_scheduled(houses_name) else None
+        self.report_dead_letters(houses_name, start)
+        checkpoint.save(houses.take_new("checkpoint"))
+        sink.write(houses.take_new("output"))
+        sink.close()
+        return houses, processed_keys
+
+    def report_dead_letters(self, name, start):
+        dead_letters = self.retries.count_dead_letters(name, start)
+        if dead_letters:
+            logger.error("{} items of {} could not be processed after retrying them".format(dead_letters, name))
+            print("")
+            print("{} items of {} could not be processed, see the dead_letters table".format(dead_letters, name))
+
+    def save_houses(self, scope, houses_keys_df, processed_keys):
+        processed = houses_keys_df[self.key].astype(str).isin(processed_keys)
+        houses_keys_df.loc[processed, 'processed'] = True
+        self.save_ids(scope, houses_keys_df)
+        self.record_listings(houses_keys_df[processed])
+
+    def record_listings(self, processed_df):
+        if self.listing_index is None or "listing_id" not in processed_df:
+            return
+        self.listing_index.record_many(self.site, zip(processed_df.listing_id, processed_df.fingerprint.fillna("")))
+
+    def get_houses_info(self):
+        logger.info("Start get_houses_info {}".format(self.site))
+        print("Start {} houses info Scrapping".format(self.title))
+        for scope in self.scopes:
+            label = "-".join(scope)
+            logger.info("Start get_houses_info {} {}".format(self.site, label))
+            print("Start {} houses info Scrapping".format(label))
+            houses_keys_df = pd.read_csv(self.get_ids_filename(scope))
+            houses_keys_df.drop_duplicates(subset=self.key, keep="first", inplace=True)
+            # The houses already marked as processed in the ids file are not downloaded again
+            to_process = houses_keys_df[houses_keys_df["processed"].astype(str).str.lower() != "true"]
+            houses, processed_keys = self.scrap_houses(scope, to_process[self.key], fetch_all,
+                                                       lambda: to_process.shape[0])
+            self.save_houses(scope, houses_keys_df, processed_keys)
+            logger.info("End get_houses_info {} {}".format(self.site, label))
+            print("")
+            print("End {} houses info Scrapping".format(label))
+        logger.info("End get_houses_info {}".format(self.site))
+        print("End {} houses info Scrapping".format(self.title))
+
+    def scrap_pipeline(self):
+        logger.info("Start scrap_pipeline {}".format(self.site))
+        print("Start {} pipeline Scrapping".format(self.title))
+        for scope in self.scopes:
+            label = "-".join(scope)
+            logger.info("Start scrap_pipeline {} {}".format(self.site, label))
+            print("Start {} pipeline Scrapping".format(label))
+            houses_keys = RecordBuffer(self.get_ids_columns())
+            discovered_keys = self.iter_ids(scope, houses_keys, show_progress=False)
+            houses, processed_keys = self.scrap_houses(scope, unique(discovered_keys), run_pipeline,
+                                                       lambda: len(houses_keys))
+            houses_keys_df = houses_keys.to_dataframe().drop_duplicates(subset=self.key, keep="first")
+            self.save_houses(scope, houses_keys_df, processed_keys)
+            logger.info("End scrap_pipeline {} {}".format(self.site, label))
+            print("")
+            print("End {} pipeline Scrapping".format(label))
+        logger.info("End scrap_pipeline {}".format(self.site))
+        print("End {} pipeline Scrapping".format(self.title))
+
+    def scrap(self):
+        self.scrap_ids()
+        self.get_houses_info()
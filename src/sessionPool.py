@@ -0,0 +1,112 @@
+from threading import Lock
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util.retry import Retry
+
+
+class PoolStats:
+    def __init__(self):
+        self.requests = 0
+        self.connections_opened = 0
+        self.lock = Lock()
+
+    def add_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def add_connection(self):
+        with self.lock:
+            self.connections_opened += 1
+
+    def as_dict(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections_opened,
+                "connections_reused": max(self.requests - self.connections_opened, 0)
+            }
+
+
+class CountingHTTPAdapter(HTTPAdapter):
+    def __init__(self, stats, **kwargs):
+        self.stats = stats
+        super().__init__(**kwargs)
+
+    def get_pool_classes(self):
+        stats = self.stats
+
+        class CountingHTTPConnectionPool(HTTPConnectionPool):
+            def _new_conn(self):
+                stats.add_connection()
+                return super()._new_conn()
+
+        class CountingHTTPSConnectionPool(HTTPSConnectionPool):
+            def _new_conn(self):
+                stats.add_connection()
+                return super()._new_conn()
+
+        return {"http": CountingHTTPConnectionPool, "https": CountingHTTPSConnectionPool}
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = self.get_pool_classes()
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        manager.pool_classes_by_scheme = self.get_pool_classes()
+        return manager
+
+    def send(self, request, **kwargs):
+        self.stats.add_request()
+        return super().send(request, **kwargs)
+
+
+class SessionPool:
+    def __init__(self, config, workers=1):
+        self.pool_connections = config.get("pool_connections", 1)
+        self.pool_maxsize = config.get("pool_maxsize", max(workers, 1))
+        self.retries = config.get("retries", 3)
+        self.backoff_factor = config.get("backoff_factor", 0.5)
+        self.keep_alive = config.get("keep_alive", "True").lower() == "true"
+        self.sessions = {}
+        self.stats = {}
+        self.lock = Lock()
+
+    def new_session(self, host, retries):
+        if host not in self.stats:
+            self.stats[host] = PoolStats()
+        retry = Retry(total=retries,
+                      backoff_factor=self.backoff_factor,
+                      status_forcelist=[500, 502, 503, 504]) if retries else 0
+        adapter = CountingHTTPAdapter(self.stats[host],
+                                      pool_connections=self.pool_connections,
+                                      pool_maxsize=self.pool_maxsize,
+                                      max_retries=retry)
+        session = requests.Session()
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    # Proxied requests have their own sessions that never retry, so each failure of a proxy is reported to the proxy
+    # pool at once instead of after several connections through the same dead proxy.
+    def get_session(self, url, proxied=False):
+        host = urlparse(url).netloc
+        with self.lock:
+            if (host, proxied) not in self.sessions:
+                self.sessions[host, proxied] = self.new_session(host, 0 if proxied else self.retries)
+            return self.sessions[host, proxied]
+
+    def get_stats(self):
+        with self.lock:
+            return {host: stats.as_dict() for host, stats in self.stats.items()}
+
+    def close(self):
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
@@ -0,0 +1,99 @@
+import json
+import sqlite3
+from time import time
+
+
+# Shards of work shared by several processes or hosts through a SQLite file. A shard is leased by the process that
+# claims it and renewed while the process works on it; if the process dies, the lease expires and the shard can be
+# claimed again by another one.
+class ShardQueue:
+    def __init__(self, filename, lease_seconds=3600):
+        self.lease_seconds = lease_seconds
+        self.connection = sqlite3.connect(filename, timeout=30, isolation_level=None)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS shards (
+                run_id TEXT NOT NULL,
+                shard_id TEXT NOT NULL,
+                data TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                PRIMARY KEY (run_id, shard_id)
+            )
+        """)
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS merges (
+                run_id TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                merged_at REAL NOT NULL
+            )
+        """)
+
+    # Every process adds the same shards; the ones already added, by this or another process, are kept as they are.
+    def add_shards(self, run_id, shards):
+        self.connection.execute("BEGIN IMMEDIATE")
+        self.connection.executemany("INSERT OR IGNORE INTO shards (run_id, shard_id, data) VALUES (?, ?, ?)",
+                                    [(run_id, shard["shard_id"], json.dumps(shard)) for shard in shards])
+        self.connection.execute("COMMIT")
+
+    def claim(self, run_id, owner):
+        now = time()
+        self.connection.execute("BEGIN IMMEDIATE")
+        row = self.connection.execute("""
+            SELECT shard_id, data FROM shards
+            WHERE run_id = ? AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+            ORDER BY shard_id LIMIT 1
+        """, (run_id, now)).fetchone()
+        if row is not None:
+            self.connection.execute("""
+                UPDATE shards SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1
+                WHERE run_id = ? AND shard_id = ?
+            """, (owner, now + self.lease_seconds, run_id, row[0]))
+        self.connection.execute("COMMIT")
+        return json.loads(row[1]) if row is not None else None
+
+    # Extends the lease of a shard while its owner is still scrapping it. False if the lease was lost.
+    def renew(self, run_id, shard_id, owner):
+        cursor = self.connection.execute("""
+            UPDATE shards SET lease_expires = ?
+            WHERE run_id = ? AND shard_id = ? AND owner = ? AND status = 'leased'
+        """, (time() + self.lease_seconds, run_id, shard_id, owner))
+        return cursor.rowcount == 1
+
+    def complete(self, run_id, shard_id, owner, error=None):
+        self.connection.execute("""
+            UPDATE shards SET status = ?, error = ?, lease_expires = NULL
+            WHERE run_id = ? AND shard_id = ? AND owner = ?
+        """, ("error" if error else "done", error, run_id, shard_id, owner))
+
+    def is_finished(self, run_id):
+        row = self.connection.execute("""
+            SELECT COUNT(*) FROM shards WHERE run_id = ? AND status IN ('pending', 'leased')
+        """, (run_id,)).fetchone()
+        return row[0] == 0
+
+    def get_shards(self, run_id, status=None):
+        rows = self.connection.execute("SELECT data, status FROM shards WHERE run_id = ? ORDER BY shard_id",
+                                       (run_id,)).fetchall()
+        return [json.loads(data) for data, shard_status in rows if status is None or shard_status == status]
+
+    # The last run with shards that was not merged yet, or None.
+    def get_last_run_id(self):
+        row = self.connection.execute("""
+            SELECT MAX(run_id) FROM shards WHERE run_id NOT IN (SELECT run_id FROM merges)
+        """).fetchone()
+        return row[0]
+
+    def is_merged(self, run_id):
+        return self.connection.execute("SELECT 1 FROM merges WHERE run_id = ?", (run_id,)).fetchone() is not None
+
+    # Only the first process that asks merges the outputs of the run.
+    def claim_merge(self, run_id, owner):
+        cursor = self.connection.execute("INSERT OR IGNORE INTO merges (run_id, owner, merged_at) VALUES (?, ?, ?)",
+                                         (run_id, owner, time()))
+        return cursor.rowcount == 1
+
+    def close(self):
+        self.connection.close()
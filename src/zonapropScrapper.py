@@ -1,13 +1,16 @@
 import json
 import logging
-from time import sleep
-import random
-import datetime
+from time import time
 
-import pandas as pd
-import os
 from progressBarPrinter import print_progress_bar
-from bs4 import BeautifulSoup
+from jsonExtractor import iter_list_postings
+from recordBuffer import RecordBuffer
+from checkpointStore import CheckpointStore
+from outputSink import open_output_sink
+from scrapperEngine import ScrapperEngine, GONE_STATUSES
+from backgroundStage import BackgroundStage
+from listingIndex import make_fingerprint
+from metrics import metrics
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -18,30 +21,28 @@ fh.setFormatter(formatter)
 logger.addHandler(fh)
 
 
-class ZonapropScrapper:
-
-    def __init__(self, config, request_getter, path):
-        self.from_page = config["from_page"]
-        self.pages = config["pages"]
-        self.publisher_types = config["publisher_types"]
-        self.ids_filename = config["ids_filename"]
-        self.result_filename = config["result_filename"]
-        self.sleep = config["sleep"]
-        self.request_getter = request_getter
-        self.path = path
-        logger.info("Start with configuration: [{}]".format(config))
-        print("----------------------")
-        print("ZONA PROP SCRAPPER CONFIGURATION:")
-        print("page from: {}".format(self.from_page))
-        print("pages: {}".format(self.pages))
-        print("publishers types: {}".format(self.publisher_types))
-        print("id filename prefix: {}".format(self.ids_filename))
-        print("result filename prefix: {}".format(self.result_filename))
-        print("----------------------")
-
-    def get(self, url):
-        response = self.request_getter.get(url, skip_proxy=True)
-        return BeautifulSoup(response.content, 'html.parser') if response is not None else response
+# The search pages of Zonaprop already have the houses, so it does not use the ids files of the engine; the contact of
+# each house is requested in the background.
+class ZonapropScrapper(ScrapperEngine):
+    site = "zonaprop"
+    title = "ZonaProp"
+
+    def __init__(self, config, request_getter, path, listing_index=None, listing_store=None):
+        self.contact_workers = config.get("contact_workers", 1)
+        self.contact_max_attempts = config.get("contact_max_attempts", 3)
+        self.contact_retry_delay = config.get("contact_retry_delay", 60)
+        super().__init__(config, request_getter, path, listing_index, listing_store)
+
+    def get_site_configuration(self):
+        return [("contact workers", self.contact_workers)]
+
+    def get_search_url(self, scope, page):
+        page_part = "-pagina-" + str(page) if page > 1 else ""
+        return 'https://www.zonaprop.com.ar/inmuebles-{publisher_type}{page_part}.html'.format(
+            publisher_type=scope[0], page_part=page_part)
+
+    def get_search_page(self, url):
+        return self.request_getter.get(url, skip_proxy=True)
 
     def post(self, url, data):
         headers = {
@@ -50,57 +51,141 @@ class ZonapropScrapper:
             'Host': "www.zonaprop.com.ar",
             'origin': "www.zonaprop.com.ar",
         }
-        response = self.request_getter.post(url, data, headers)
+        response = self.request_getter.post(url, data, headers, budget="zonaprop_contact")
         return response.json()
 
+    def get_fingerprint(self, house_json):
+        return make_fingerprint(json.dumps(house_json.get("priceOperationTypes"), sort_keys=True),
+                                house_json.get("title"),
+                                house_json.get("descriptionNormalized"))
+
+    # Returns the ids of the houses that got their contact.
+    def add_contacts(self, houses, houses_by_id, contacts_checkpoint, contacts, fingerprints):
+        for posting_id, contact_info in contacts:
+            if posting_id in houses_by_id:
+                houses.update(houses_by_id[posting_id], contact_info)
+        contacts_checkpoint.save([dict(contact_info, postingId=posting_id) for posting_id, contact_info in contacts])
+        if self.listing_index is not None:
+            self.listing_index.record_many("zonaprop", [(posting_id, fingerprints[posting_id])
+                                                        for posting_id, contact_info in contacts
+                                                        if "contact_error" not in contact_info
+                                                        and posting_id in fingerprints])
+        return [posting_id for posting_id, contact_info in contacts]
+
+    # In streaming mode each house is written as soon as it is complete, and forgotten.
+    def write_houses(self, sink, houses_by_id, posting_ids):
+        sink.write([houses_by_id.pop(posting_id) for posting_id in posting_ids if posting_id in houses_by_id])
+
     def scrap(self):
         logger.info("Start scrap")
         print("Start ZonaProp Scrapping")
-        for publisher_type in self.publisher_types:
+        for scope in self.scopes:
+            publisher_type = scope[0]
             logger.info("Start {} scrapping".format(publisher_type))
             print("Start {} scrapping".format(publisher_type))
-            houses_df = pd.DataFrame()
+            houses = RecordBuffer()
+            checkpoint = CheckpointStore(self.path, "{}_{}".format(self.result_filename, publisher_type))
+            records, processed_pages = checkpoint.start(self.resume)
+            pages_name = "{}_{}_pages".format(self.result_filename, publisher_type)
+            self.retries.start(pages_name, self.resume)
+            start = time()
+            houses.extend(records)
+            houses.take_new("checkpoint")
+            houses_by_id = {house_info["postingId"]: house_info for house_info in records}
+            sink = open_output_sink(self.output, self.path, "{}_{}".format(self.result_filename, publisher_type),
+                                    self.listing_store, "zonaprop")
+
+            contacts = BackgroundStage("contact", self.get_contact_info, self.contact_workers,
+                                       self.contact_max_attempts, self.contact_retry_delay)
+            contacts_checkpoint = CheckpointStore(self.path,
+                                                  "{}_{}_contacts".format(self.result_filename, publisher_type))
+            contacts_records, _ = contacts_checkpoint.start(self.resume)
+            for contact_info in contacts_records:
+                houses.update(houses_by_id[contact_info["postingId"]], contact_info)
+            contacted_ids = set(contact_info["postingId"] for contact_info in contacts_records)
+            fingerprints = {}
+            for posting_id, house_info in houses_by_id.items():
+                if posting_id not in contacted_ids:
+                    contacts.submit(posting_id, house_info)
+            if self.streaming:
+                self.write_houses(sink, houses_by_id, contacted_ids)
+
             print_progress_bar(0, (self.from_page + self.pages - 1) * 20, publisher_type + " houses")
-            for i in range(self.from_page, self.from_page + self.pages):
-                page_part = "-pagina-" + str(i) if i > 1 else ""
-                search_url_inmu = 'https://www.zonaprop.com.ar/inmuebles-{publisher_type}{page_part}.html'.format(
-                    publisher_type=publisher_type, page_part=page_part).replace("\'", '"')
-                response_soup = self.get(search_url_inmu)
-                for script in response_soup.find_all("script"):
-                    if 'listPostings = ' in script.text:
-                        house_list = script.text.split('listPostings = ')[1].split('const developmentData ')[0].strip()[:-1]
-                        break
-
-                houses_list_json = json.loads(house_list)
-                processed_list = []
-                for house_json, j in zip(houses_list_json, range(0, len(houses_list_json))):
-                    house_info = self.process_house_info(house_json)
-                    house_info.update(self.get_contact_info(house_json))
-                    processed_list.append(house_info)
-                    if self.sleep:
-                        sleep_time = random.randint(15, 45)
-                        print_progress_bar((i - 1) * 20 + j + 1, (self.from_page + self.pages - 1) * 20,
-                                           publisher_type + " houses sleep " + str(sleep_time) + "seconds")
-                        sleep(sleep_time)
-                    else:
-                        print_progress_bar((i - 1) * 20 + j + 1, (self.from_page + self.pages - 1) * 20,
-                                           publisher_type + " houses")
-                houses_temp_df = pd.DataFrame.from_records(processed_list)
-                houses_df = pd.concat([houses_df, houses_temp_df], axis=0, sort=False).reset_index().drop(
-                    columns="index")
-                houses_df.to_csv(self.path + "/temp/temp_{}_{}.csv".format(self.result_filename, publisher_type),
-                                 index=False, encoding="UTF-8")
-
-            directory = self.path + "/results/" + datetime.datetime.today().strftime('%Y-%m-%d')
-            if not os.path.exists(directory):
-                os.makedirs(directory)
-            houses_df.to_csv(directory + "/{}_{}.csv".format(self.result_filename, publisher_type), index=False,
-                             encoding="UTF-8")
+            pages = range(self.from_page, self.from_page + self.pages)
+            for i in self.retries.iter_items(pages_name, (page for page in pages if page not in processed_pages)):
+                search_url_inmu = self.get_search_url(scope, i)
+                response = self.get_search_page(search_url_inmu)
+                if response is None or not response.ok:
+                    status = response.status_code if response is not None else None
+                    logger.info("Error trying to get this page: number[{}] publisher_type[{}] url[{}] "
+                                "status[{}]".format(i, publisher_type, search_url_inmu, status))
+                    self.retries.fail(pages_name, i, "page not downloaded", terminal=status in GONE_STATUSES)
+                    continue
+
+                try:
+                    page_postings = list(iter_list_postings(response.content))
+                except ValueError as e:
+                    logger.error("Error decoding listPostings: number[{}] publisher_type[{}] url[{}] error[{}]".format(
+                        i, publisher_type, search_url_inmu, e))
+                    self.retries.fail(pages_name, i, "listPostings not decoded: {}".format(e))
+                    continue
+                # A page without houses is after the last page of results, trying it again gives the same page
+                if not page_postings:
+                    logger.info("Error trying to get the houses list: number[{}] publisher_type[{}] url[{}]".format(
+                        i, publisher_type, search_url_inmu))
+                    self.retries.fail(pages_name, i, "no houses in page", terminal=True)
+                    continue
+
+                page_houses = []
+                page_ids = []
+                for j, house_json in enumerate(page_postings):
+                    with metrics.timer("extract_seconds", site="zonaprop"):
+                        house_info = self.process_house_info(house_json)
+                    metrics.inc("houses_total", site="zonaprop", result="ok")
+                    houses.append(house_info)
+                    houses_by_id[house_info["postingId"]] = house_info
+                    page_ids.append(house_info["postingId"])
+                    page_houses.append({"listing_id": house_info["postingId"],
+                                        "fingerprint": self.get_fingerprint(house_json)})
+                    print_progress_bar((i - 1) * 20 + j + 1, (self.from_page + self.pages - 1) * 20,
+                                       publisher_type + " houses")
+                if self.listing_index is not None:
+                    page_houses = self.listing_index.filter_changed("zonaprop", page_houses)
+                changed_ids = set()
+                for house in page_houses:
+                    fingerprints[house["listing_id"]] = house["fingerprint"]
+                    changed_ids.add(house["listing_id"])
+                    contacts.submit(house["listing_id"], houses_by_id[house["listing_id"]])
+                checkpoint.mark_processed(i)
+                checkpoint.save(houses.take_new("checkpoint"))
+                self.retries.succeed(pages_name, i)
+                contacted_ids = self.add_contacts(houses, houses_by_id, contacts_checkpoint, contacts.completed(),
+                                                  fingerprints)
+                if self.streaming:
+                    self.write_houses(sink, houses_by_id, [posting_id for posting_id in page_ids
+                                                           if posting_id not in changed_ids] + contacted_ids)
+                    houses.release()
+
+            self.report_dead_letters(pages_name, start)
+            print("")
+            print("Waiting for {} contacts".format(contacts.pending))
+            contacted_ids = self.add_contacts(houses, houses_by_id, contacts_checkpoint, contacts.join(), fingerprints)
+
+            # The contacts are added to the houses after they are found, so they are written once all are done
+            if self.streaming:
+                self.write_houses(sink, houses_by_id, contacted_ids + list(houses_by_id))
+            else:
+                sink.write(houses.records)
+            sink.close()
             logger.info("End scrap {}".format(publisher_type))
             print("")
             print("End {}  Scrapping".format(publisher_type))
         logger.info("End scrap")
 
+    # The houses are found and downloaded in the same pass.
+    def scrap_pipeline(self):
+        self.scrap()
+
     def process_house_info(self, house_json):
         logger.info("Start process_house_info")
         keys_to_keep = ["postingId", 'title', 'descriptionNormalized', "antiquity", 'url', 'postingType']
@@ -214,5 +299,6 @@ class ZonapropScrapper:
     def get_contact_info(self, house_info):
         data = "idAviso={}&page=ficha".format(house_info['postingId'])
         contact_response = self.post('https://www.zonaprop.com.ar/aviso_verDatosAnunciante.ajax', data)
-        return self.process_contact_info(contact_response)
+        with metrics.timer("extract_seconds", site="zonaprop", stage="contact"):
+            return self.process_contact_info(contact_response)
 
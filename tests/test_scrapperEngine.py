@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+# Runs the scrappers over the fixture pages of the benchmarks (see benchmarks/fixturePages.py).
+# Usage: python3 -m pytest tests
+
+import io
+import os
+import sys
+from contextlib import redirect_stdout
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+# Zonaprop does not save ids files.
+SITES = ["lavoz", "meli", "olx"]
+
+
+def run_scrapper(site, path, pipeline):
+    from fixturePages import FakeRequestGetter
+    from orchestrator import SCRAPPERS
+    from listingIndex import ListingIndex
+    from scrapperThroughput import build_config
+
+    config = build_config(site, 2, 2, False)
+    scrapper = SCRAPPERS[site](config, FakeRequestGetter(2), path, ListingIndex(path + "/listing_index.sqlite"))
+    with redirect_stdout(io.StringIO()):
+        scrapper.scrap_pipeline() if pipeline else scrapper.scrap()
+    return scrapper
+
+
+# On the second run every house is unchanged in the listing index, so the scope has no house to download.
+@pytest.mark.parametrize("pipeline", [False, True])
+@pytest.mark.parametrize("site", SITES)
+def test_rerun_with_listing_index(site, pipeline, tmp_path, monkeypatch):
+    import pandas as pd
+
+    monkeypatch.chdir(ROOT)
+    path = str(tmp_path)
+    os.makedirs(path + "/temp")
+    scrapper = run_scrapper(site, path, pipeline)
+    ids_filenames = [scrapper.get_ids_filename(scope) for scope in scrapper.scopes]
+    assert all(pd.read_csv(filename).shape[0] > 0 for filename in ids_filenames)
+
+    scrapper = run_scrapper(site, path, pipeline)
+    for filename in ids_filenames:
+        ids = pd.read_csv(filename)
+        assert ids.empty
+        assert list(ids.columns) == scrapper.get_ids_columns()